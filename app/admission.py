@@ -0,0 +1,135 @@
+import asyncio
+import math
+import time
+import logging
+from contextlib import asynccontextmanager
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+class ConcurrencyLimiter:
+    """
+    Bounds the number of requests running an endpoint at once. Requests beyond
+    the limit wait in a bounded queue; when the queue is full they are rejected
+    immediately with 429, and when they wait too long with 503.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+        self.active = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.total_wait_seconds = 0.0
+        # Exponentially weighted average of how long an admitted request holds its slot
+        self.avg_service_seconds = 0.0
+
+    def retry_after(self) -> int:
+        # Rough time until a slot frees up for a request joining the back of the queue
+        estimate = self.avg_service_seconds * (self.waiting + 1) / self.max_concurrent
+        return max(1, math.ceil(estimate))
+
+    async def acquire(self) -> float:
+        if self.active + self.waiting >= self.max_concurrent + self.max_queue:
+            self.rejected_queue_full += 1
+            logger.warning(f"🚦 {self.name}: queue full ({self.active} active, {self.waiting} waiting), rejecting request")
+            raise AdmissionRejected(429, f"Too many concurrent {self.name} requests, please retry later", self.retry_after())
+
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        wait_start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            logger.warning(f"🚦 {self.name}: no slot after {self.queue_timeout}s, rejecting request")
+            raise AdmissionRejected(503, f"{self.name} is saturated, please retry later", self.retry_after())
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - wait_start
+        self.total_wait_seconds += waited
+        self.admitted += 1
+        self.active += 1
+        return time.monotonic()
+
+    def release(self, admitted_at: float):
+        service_seconds = time.monotonic() - admitted_at
+        if self.avg_service_seconds:
+            self.avg_service_seconds = 0.8 * self.avg_service_seconds + 0.2 * service_seconds
+        else:
+            self.avg_service_seconds = service_seconds
+        self.active -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Holds a slot for work started outside its own endpoint (e.g. by a report stream).
+        """
+        admitted_at = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(admitted_at)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_wait_seconds": round(self.total_wait_seconds / self.admitted, 3) if self.admitted else 0.0,
+            "avg_service_seconds": round(self.avg_service_seconds, 3)
+        }
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that applies a ConcurrencyLimiter per request path. It runs
+    before the request body is read, so rejected uploads cost almost nothing, and
+    the slot is held until the response (including streamed bodies) has been sent.
+    """
+
+    def __init__(self, app, limiters: dict):
+        self.app = app
+        self.limiters = limiters
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiters.get(scope["path"]) if scope["type"] == "http" else None
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            admitted_at = await limiter.acquire()
+        except AdmissionRejected as rejection:
+            response = JSONResponse(
+                status_code=rejection.status_code,
+                content={"detail": rejection.detail},
+                headers={"Retry-After": str(rejection.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(admitted_at)
@@ -0,0 +1,38 @@
+import importlib
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Agent name -> (module, class). Modules are only imported when the agent is
+# first requested, which keeps worker start-up and health probes cheap.
+AGENT_CLASSES = {
+    "pdf_extractor": ("direct_pdf_extractor", "DirectPDFExtractor"),
+    "pitchdeck": ("pitchdeck_agent", "PitchDeckAgent"),
+    "product": ("product_agent", "ProductAgent"),
+    "web_research": ("web_research_agent", "WebResearchAgent"),
+    "market_size": ("market_size_agent", "MarketSizeAgent"),
+    "report_generator": ("report_generator_agent", "ReportGeneratorAgent"),
+}
+
+_instances = {}
+_lock = threading.Lock()
+
+def get_agent(name: str):
+    agent = _instances.get(name)
+    if agent is not None:
+        return agent
+    
+    if name not in AGENT_CLASSES:
+        raise KeyError(f"Unknown agent: {name}")
+    
+    with _lock:
+        if name not in _instances:
+            module_name, class_name = AGENT_CLASSES[name]
+            agent_class = getattr(importlib.import_module(module_name), class_name)
+            _instances[name] = agent_class()
+            logger.info(f"🤖 Initialized agent: {name}")
+        return _instances[name]
+
+def loaded_agents() -> list:
+    return sorted(_instances)
@@ -0,0 +1,172 @@
+import math
+import time
+import logging
+from collections import deque
+from settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpen(Exception):
+    def __init__(self, breaker):
+        super().__init__(f"{breaker.name} is unavailable (circuit open), retry in {breaker.retry_after()}s")
+        self.breaker_name = breaker.name
+        self.retry_after = breaker.retry_after()
+
+def find_circuit_open(error: BaseException):
+    """
+    Returns the CircuitOpen behind error, if any. Agents re-raise failures as
+    plain exceptions, but the original one stays in the exception context.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, CircuitOpen):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of the last calls to one upstream (a provider or model).
+    When too many of them failed or were slow the circuit opens and calls fail
+    immediately with CircuitOpen; after open_seconds a single probe call is let
+    through, and its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, name: str, failure_errors: tuple, slow_call_seconds: float, failure_rate: float,
+                 min_calls: int, window: int, open_seconds: float, enabled: bool = True):
+        self.name = name
+        self.failure_errors = failure_errors
+        self.slow_call_seconds = slow_call_seconds
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.enabled = enabled
+
+        self.state = "closed"
+        # (failed, slow) for the most recent calls
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.trips = 0
+        self.rejected = 0
+
+    def retry_after(self) -> int:
+        if self.state != "open":
+            return 1
+        return max(1, math.ceil(self.open_seconds - (time.monotonic() - self.opened_at)))
+
+    def allow_request(self) -> bool:
+        if not self.enabled or self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.open_seconds
+        return not self.probe_in_flight
+
+    def _acquire(self) -> bool:
+        # True when this call is the half-open probe
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                raise CircuitOpen(self)
+            self.state = "half_open"
+            logger.info(f"⚡ {self.name}: circuit half-open, probing for recovery")
+        if self.state == "half_open":
+            if self.probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpen(self)
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def _open(self, reason: str):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        logger.warning(f"⚡ {self.name}: circuit opened ({reason}), failing fast for {self.open_seconds:.0f}s")
+
+    def _record(self, failed: bool, latency: float, probe: bool, slow_call_seconds: float):
+        slow = bool(slow_call_seconds) and latency > slow_call_seconds
+        if self.state == "half_open":
+            if not probe:
+                # Calls started while the circuit was still closed do not decide recovery
+                return
+            self.probe_in_flight = False
+            if failed or slow:
+                self._open("probe failed" if failed else f"probe took {latency:.1f}s")
+            else:
+                self.state = "closed"
+                self.outcomes.clear()
+                logger.info(f"✅ {self.name}: circuit closed, upstream recovered")
+            return
+        if self.state == "open":
+            # Calls started before the circuit opened have no say any more
+            return
+
+        self.outcomes.append((failed, slow))
+        if len(self.outcomes) < self.min_calls:
+            return
+        failures = sum(failed for failed, _ in self.outcomes)
+        slow_calls = sum(slow for _, slow in self.outcomes)
+        if failures >= self.failure_rate * len(self.outcomes):
+            self._open(f"{failures}/{len(self.outcomes)} recent calls failed")
+        elif slow_calls >= self.failure_rate * len(self.outcomes):
+            self._open(f"{slow_calls}/{len(self.outcomes)} recent calls were slow")
+
+    async def call(self, request, slow_call_seconds: float = None):
+        """
+        Runs the async request() through the breaker. slow_call_seconds overrides
+        the breaker's threshold for this call; 0 never counts it as slow.
+        """
+        if not self.enabled:
+            return await request()
+
+        if slow_call_seconds is None:
+            slow_call_seconds = self.slow_call_seconds
+        probe = self._acquire()
+        start = time.monotonic()
+        try:
+            result = await request()
+        except self.failure_errors:
+            self._record(True, time.monotonic() - start, probe, slow_call_seconds)
+            raise
+        except BaseException:
+            # Cancelled, or an error that says nothing about the upstream's health
+            if probe:
+                self.probe_in_flight = False
+            raise
+        self._record(False, time.monotonic() - start, probe, slow_call_seconds)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "recent_calls": len(self.outcomes),
+            "recent_failures": sum(failed for failed, _ in self.outcomes),
+            "recent_slow_calls": sum(slow for _, slow in self.outcomes),
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "retry_after": self.retry_after() if self.state == "open" else None
+        }
+
+# Breakers are per worker process
+_breakers = {}
+
+def get_breaker(name: str, failure_errors: tuple = (Exception,), slow_call_seconds: float = 0) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        settings = get_settings()
+        breaker = _breakers[name] = CircuitBreaker(
+            name,
+            failure_errors,
+            slow_call_seconds,
+            failure_rate=settings.circuit_failure_rate,
+            min_calls=settings.circuit_min_calls,
+            window=settings.circuit_window,
+            open_seconds=settings.circuit_open_seconds,
+            enabled=settings.circuit_breakers
+        )
+    return breaker
+
+def breaker_states() -> dict:
+    return {name: breaker.stats() for name, breaker in sorted(_breakers.items())}
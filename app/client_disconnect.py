@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from fastapi.responses import Response
+
+logger = logging.getLogger(__name__)
+
+# nginx's "client closed request"; only ever seen in logs, the client is gone
+CLIENT_CLOSED_REQUEST = 499
+
+# Cumulative count of requests cancelled in this worker process, reported on /metrics
+disconnect_totals = {"cancelled_requests": 0}
+
+class CancelOnDisconnectMiddleware:
+    """
+    ASGI middleware that cancels the handler of a long-running request as soon
+    as the client disconnects, instead of letting it finish work nobody will
+    read. Cancellation unwinds every await in the handler, aborting in-flight
+    OpenAI/Perplexity HTTP requests; cleanup lives in finally blocks.
+
+    The disconnect can only be observed once the request body has been read,
+    so the watch starts when the handler has consumed the body.
+    """
+
+    def __init__(self, app, paths: set):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        disconnected = asyncio.Event()
+        response_started = asyncio.Event()
+        response_complete = asyncio.Event()
+        state = {"body_complete": False, "watcher": None}
+        handler = asyncio.current_task()
+
+        async def watch():
+            # After the body, the only message the server can send is http.disconnect,
+            # which also arrives once the response has been sent in full
+            await receive()
+            if response_complete.is_set():
+                return
+            disconnected.set()
+            disconnect_totals["cancelled_requests"] += 1
+            logger.warning(f"🔌 Client disconnected, cancelling {scope['method']} {scope['path']}")
+            handler.cancel()
+
+        async def receive_and_watch():
+            if state["body_complete"]:
+                # The watcher owns the real receive channel now
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                state["body_complete"] = True
+                state["watcher"] = asyncio.create_task(watch())
+            return message
+
+        async def send_and_track(message):
+            if message["type"] == "http.response.start":
+                response_started.set()
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete.set()
+            await send(message)
+
+        try:
+            await self.app(scope, receive_and_watch, send_and_track)
+        except asyncio.CancelledError:
+            if not disconnected.is_set():
+                raise
+            logger.info(f"🔌 Cancelled {scope['path']} after client disconnect")
+            # The cancellation was ours; don't let it leak into the server's task
+            if hasattr(handler, "uncancel"):
+                handler.uncancel()
+            if not response_started.is_set():
+                # Give outer middlewares a response to finish with; the server drops it
+                response = Response(status_code=CLIENT_CLOSED_REQUEST)
+                await response(scope, receive_and_watch, send)
+        finally:
+            if state["watcher"] is not None:
+                state["watcher"].cancel()
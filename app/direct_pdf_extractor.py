@@ -1,21 +1,26 @@
 import openai
+import asyncio
 import os
 import base64
 import logging
 import tempfile
-from dotenv import load_dotenv
+from settings import get_settings
+from model_router import get_model_router
+from pdf_optimizer import slim_pdf
+from circuit_breaker import CircuitOpen
 from PyPDF2 import PdfReader, PdfWriter
 
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class DirectPDFExtractor:
     def __init__(self):
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = openai.AsyncOpenAI(api_key=get_settings().openai_api_key)
+        self.model_router = get_model_router()
         self.max_pages_per_chunk = 20
+        # Number of chunks extracted in parallel for large decks
+        self.max_concurrent_chunks = get_settings().extraction_concurrency
+        # Files API deletes that must outlive a cancelled request
+        self._cleanup_tasks = set()
     
     def count_pdf_pages(self, pdf_path: str) -> int:
         try:
@@ -69,7 +74,59 @@ class DirectPDFExtractor:
             logger.error(f"❌ Error splitting PDF: {str(e)}")
             raise Exception(f"Failed to split PDF: {str(e)}")
     
-    async def extract_text_from_single_pdf(self, pdf_path: str, start_page: int = None, end_page: int = None) -> str:
+    async def _upload_pdf(self, pdf_path: str):
+        with open(pdf_path, "rb") as f:
+            return await self.client.files.create(
+                file=f,
+                purpose="assistants"
+            )
+    
+    async def _delete_upload(self, file_id: str):
+        try:
+            await self.client.files.delete(file_id)
+            logger.info(f"🗑️ Cleaned up uploaded file: {file_id}")
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to clean up uploaded file {file_id}: {str(e)}")
+    
+    def _run_cleanup(self, coro):
+        # Cleanup runs as its own task so that a cancelled caller cannot interrupt it
+        task = asyncio.ensure_future(coro)
+        self._cleanup_tasks.add(task)
+        task.add_done_callback(self._cleanup_tasks.discard)
+        return task
+    
+    def _schedule_delete(self, file_id: str):
+        return self._run_cleanup(self._delete_upload(file_id))
+    
+    def _delete_late_upload(self, upload_task):
+        # The request was cancelled while the upload was in flight
+        if not upload_task.cancelled() and upload_task.exception() is None:
+            self._schedule_delete(upload_task.result().id)
+    
+    def extract_text_layer(self, pdf_path: str) -> str:
+        # Same "=" page markers the extraction prompt asks the model for
+        reader = PdfReader(pdf_path)
+        return "=\n" + "\n=\n".join(page.extract_text() or "" for page in reader.pages)
+    
+    async def extract_text_locally(self, pdf_path: str) -> str:
+        """
+        Degraded mode while the extraction models are unavailable: the PDF's own
+        text layer, which misses text inside images and scanned pages.
+        """
+        logger.warning(f"⚡ Extraction models unavailable, using the PDF text layer of {pdf_path}")
+        extracted_text = await asyncio.to_thread(self.extract_text_layer, pdf_path)
+        logger.info(f"✅ Local text extraction completed. Text length: {len(extracted_text)} characters")
+        return extracted_text
+    
+    async def extract_text_from_single_pdf(self, pdf_path: str, start_page: int = None, end_page: int = None) -> tuple:
+        """
+        Returns (text, degraded); degraded when the text comes from the PDF text layer.
+        """
+        # Don't upload a file no model is available to read
+        if not self.model_router.is_available("pdf_extractor.extract_text"):
+            return await self.extract_text_locally(pdf_path), True
+        
+        upload = None
         try:
             # Log detailed chunk information
             if start_page and end_page:
@@ -80,11 +137,14 @@ class DirectPDFExtractor:
                 logger.info(f"📄 Processing single PDF: {pdf_path} ({file_size} bytes)")
             
             # 1. Upload PDF via Files API
-            with open(pdf_path, "rb") as f:
-                upload = self.client.files.create(
-                    file=f,
-                    purpose="assistants"
-                )
+            # Shielded: if the request is cancelled mid-upload the file may still be
+            # created, and it can only be deleted once we know its ID
+            upload_task = asyncio.ensure_future(self._upload_pdf(pdf_path))
+            try:
+                upload = await asyncio.shield(upload_task)
+            except asyncio.CancelledError:
+                upload_task.add_done_callback(self._delete_late_upload)
+                raise
             
             logger.info(f"✅ PDF uploaded successfully. File ID: {upload.id}, Size: {file_size} bytes")
             
@@ -105,21 +165,25 @@ Return only the text with clear page markers like:
             
             # 3. Use Responses API with file_id for actual extraction
             logger.info(f"📝 Sending extraction prompt: {extraction_prompt[:100]}...")
-            response = self.client.responses.create(
-                model="gpt-4o",
-                input=[{
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "input_text", 
-                            "text": extraction_prompt
-                        },
-                        {
-                            "type": "input_file", 
-                            "file_id": upload.id
-                        }
-                    ]
-                }]
+            response = await self.model_router.call(
+                "pdf_extractor.extract_text",
+                extraction_prompt,
+                lambda model: self.client.responses.create(
+                    model=model,
+                    input=[{
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "input_text", 
+                                "text": extraction_prompt
+                            },
+                            {
+                                "type": "input_file", 
+                                "file_id": upload.id
+                            }
+                        ]
+                    }]
+                )
             )
             
             extracted_text = response.output_text
@@ -133,74 +197,135 @@ Return only the text with clear page markers like:
                 logger.warning(f"⚠️ Response length: {len(extracted_text)} characters")
             
             logger.info(f"✅ PDF text extraction completed. Text length: {len(extracted_text)} characters")
-            logger.info(f"📄 Response preview: {extracted_text[:300]}...")
+            logger.debug(f"📄 Response preview: {extracted_text[:300]}...")
             
-            # 3. Clean up the uploaded file
-            self.client.files.delete(upload.id)
-            logger.info(f"🗑️ Cleaned up uploaded file: {upload.id}")
-            
-            return extracted_text
+            return extracted_text, False
+        
+        except CircuitOpen:
+            return await self.extract_text_locally(pdf_path), True
                 
         except Exception as e:
             logger.error(f"❌ PDF extraction error: {str(e)}")
-            # Try to clean up file if it was uploaded
-            try:
-                if 'upload' in locals():
-                    self.client.files.delete(upload.id)
-            except:
-                pass
             raise Exception(f"Failed to extract text from PDF: {str(e)}")
+        
+        finally:
+            # 3. Clean up the uploaded file, also when cancelled (shielded so the
+            # delete is sent even if the request is cancelled again meanwhile)
+            if upload is not None:
+                await asyncio.shield(self._schedule_delete(upload.id))
     
-    async def extract_text_from_pdf(self, pdf_path: str) -> str:
+    async def iter_text_chunks(self, pdf_path: str):
+        """
+        Async generator yielding each chunk's text as soon as it and every chunk
+        before it are extracted, so consumers see the document in page order
+        while later chunks are still in flight.
+        
+        Yields dicts with index, total, start_page, end_page, text and degraded
+        (the chunk was read from the PDF text layer, without the extraction model).
+        """
+        # Slim the PDF once up front so every chunk uploads fewer bytes
+        upload_path, _ = await slim_pdf(pdf_path)
+        chunks = self._iter_chunks_of(upload_path)
         try:
-            # Count pages to determine if we need chunking
-            total_pages = self.count_pdf_pages(pdf_path)
-            logger.info(f"📊 PDF has {total_pages} pages")
-            
-            # If PDF is small enough, process normally
-            if total_pages <= self.max_pages_per_chunk:
-                logger.info(f"📄 PDF is small ({total_pages} pages), processing normally")
-                return await self.extract_text_from_single_pdf(pdf_path)
-            
-            # If PDF is large, split into chunks and process each
-            logger.info(f"📄 PDF is large ({total_pages} pages), splitting into chunks")
-            chunk_files = self.split_pdf_into_chunks(pdf_path)
-            
-            all_extracted_texts = []
-            
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            # Close explicitly so chunk cleanup runs before the slimmed file is removed
             try:
-                for i, chunk_info in enumerate(chunk_files):
-                    chunk_path = chunk_info['file_path']
-                    start_page = chunk_info['start_page']
-                    end_page = chunk_info['end_page']
-                    
-                    logger.info(f"🔄 Processing chunk {i + 1}/{len(chunk_files)}: pages {start_page}-{end_page}")
-                    
-                    chunk_text = await self.extract_text_from_single_pdf(chunk_path, start_page, end_page)
-                    
-                    # Add chunk header to ensure proper sequencing
-                    chunk_with_header = f"=== CHUNK {i + 1}: PAGES {start_page}-{end_page} ===\n\n{chunk_text}"
-                    all_extracted_texts.append(chunk_with_header)
-                    
-                    logger.info(f"✅ Completed chunk {i + 1}/{len(chunk_files)}")
-                
-                # Merge all texts in order with clear separators
-                final_text = "\n\n" + "="*50 + "\n\n".join(all_extracted_texts) + "\n\n" + "="*50
-                
-                logger.info(f"✅ All chunks processed. Final text length: {len(final_text)} characters")
-                logger.info(f"📄 Final text preview: {final_text[:200]}...")
-                
-                return final_text
-                
+                await chunks.aclose()
             finally:
-                # Clean up temporary chunk files
-                for chunk_info in chunk_files:
-                    try:
-                        os.unlink(chunk_info['file_path'])
-                        logger.info(f"🗑️ Cleaned up chunk file: {chunk_info['file_path']}")
-                    except Exception as cleanup_error:
-                        logger.warning(f"⚠️ Failed to clean up chunk file {chunk_info['file_path']}: {cleanup_error}")
-                
+                if upload_path != pdf_path:
+                    os.unlink(upload_path)
+    
+    async def _iter_chunks_of(self, pdf_path: str):
+        try:
+            # Count pages to determine if we need chunking
+            # PyPDF2 parsing is CPU-bound, keep it off the event loop
+            total_pages = await asyncio.to_thread(self.count_pdf_pages, pdf_path)
+            logger.info(f"📊 PDF has {total_pages} pages")
         except Exception as e:
             logger.error(f"❌ PDF extraction error: {str(e)}")
-            raise Exception(f"Failed to extract text from PDF: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to extract text from PDF: {str(e)}")
+        
+        # If PDF is small enough, process normally
+        if total_pages <= self.max_pages_per_chunk:
+            logger.info(f"📄 PDF is small ({total_pages} pages), processing normally")
+            text, degraded = await self.extract_text_from_single_pdf(pdf_path)
+            yield {"index": 0, "total": 1, "start_page": 1, "end_page": total_pages, "text": text, "degraded": degraded}
+            return
+        
+        # If PDF is large, split into chunks and extract them concurrently
+        logger.info(f"📄 PDF is large ({total_pages} pages), splitting into chunks")
+        try:
+            chunk_files = await asyncio.to_thread(self.split_pdf_into_chunks, pdf_path)
+        except Exception as e:
+            logger.error(f"❌ PDF extraction error: {str(e)}")
+            raise Exception(f"Failed to extract text from PDF: {str(e)}")
+        
+        semaphore = asyncio.Semaphore(self.max_concurrent_chunks)
+        
+        async def extract_chunk(i: int, chunk_info: dict) -> tuple:
+            async with semaphore:
+                logger.info(f"🔄 Processing chunk {i + 1}/{len(chunk_files)}: pages {chunk_info['start_page']}-{chunk_info['end_page']}")
+                chunk_result = await self.extract_text_from_single_pdf(
+                    chunk_info['file_path'], chunk_info['start_page'], chunk_info['end_page']
+                )
+                logger.info(f"✅ Completed chunk {i + 1}/{len(chunk_files)}")
+                return chunk_result
+        
+        tasks = [asyncio.create_task(extract_chunk(i, chunk_info)) for i, chunk_info in enumerate(chunk_files)]
+        
+        try:
+            for i, (chunk_info, task) in enumerate(zip(chunk_files, tasks)):
+                text, degraded = await task
+                yield {
+                    "index": i,
+                    "total": len(chunk_files),
+                    "start_page": chunk_info['start_page'],
+                    "end_page": chunk_info['end_page'],
+                    "text": text,
+                    "degraded": degraded
+                }
+        finally:
+            # Stop remaining chunks if a chunk failed or the consumer went away
+            for task in tasks:
+                task.cancel()
+            await asyncio.shield(self._run_cleanup(self._cleanup_chunks(tasks, chunk_files)))
+    
+    async def _cleanup_chunks(self, tasks: list, chunk_files: list):
+        # Wait for cancelled chunks to delete their uploads before removing their files
+        await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # Clean up temporary chunk files
+        for chunk_info in chunk_files:
+            try:
+                os.unlink(chunk_info['file_path'])
+                logger.info(f"🗑️ Cleaned up chunk file: {chunk_info['file_path']}")
+            except Exception as cleanup_error:
+                logger.warning(f"⚠️ Failed to clean up chunk file {chunk_info['file_path']}: {cleanup_error}")
+    
+    @staticmethod
+    def format_chunk(chunk: dict) -> str:
+        # Add chunk header to ensure proper sequencing
+        return f"=== CHUNK {chunk['index'] + 1}: PAGES {chunk['start_page']}-{chunk['end_page']} ===\n\n{chunk['text']}"
+    
+    @classmethod
+    def merge_chunks(cls, chunks: list) -> str:
+        if len(chunks) == 1:
+            return chunks[0]["text"]
+        
+        # Merge all texts in order with clear separators
+        return "\n\n" + "="*50 + "\n\n".join(cls.format_chunk(chunk) for chunk in chunks) + "\n\n" + "="*50
+    
+    async def extract_text_from_pdf(self, pdf_path: str) -> tuple:
+        """
+        Returns (text, degraded); degraded when any chunk was read from the PDF text layer.
+        """
+        chunks = [chunk async for chunk in self.iter_text_chunks(pdf_path)]
+        final_text = self.merge_chunks(chunks)
+        degraded = any(chunk["degraded"] for chunk in chunks)
+        
+        logger.info(f"✅ All chunks processed. Final text length: {len(final_text)} characters")
+        logger.debug(f"📄 Final text preview: {final_text[:200]}...")
+        
+        return final_text, degraded
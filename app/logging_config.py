@@ -0,0 +1,110 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import re
+import uuid
+from contextvars import ContextVar
+
+# Request/job ID of the work currently being done. Context variables follow
+# awaits, asyncio tasks and asyncio.to_thread, so agents never need to pass it around.
+request_id_var = ContextVar("request_id", default="-")
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+
+# Secrets that must never reach the log output
+REDACTION_PATTERNS = [
+    re.compile(r"sk-[A-Za-z0-9_\-]{8,}"),
+    re.compile(r"pplx-[A-Za-z0-9_\-]{8,}"),
+    re.compile(r"(?i)bearer\s+[A-Za-z0-9_\-\.]+"),
+]
+
+_listener = None
+
+# IDs accepted from X-Request-ID; anything else could forge log lines or paths
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+def request_id_from_header(value: str = None) -> str:
+    """
+    The client's or proxy's request ID when it is well-formed, otherwise a new one.
+    """
+    if value and REQUEST_ID_PATTERN.fullmatch(value):
+        return value
+    return new_request_id()
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class PayloadPolicyFilter(logging.Filter):
+    """
+    Truncates oversized messages and redacts secrets before a record is queued.
+    """
+
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        for pattern in REDACTION_PATTERNS:
+            message = pattern.sub("[REDACTED]", message)
+        if self.max_chars and len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]}... [truncated {len(message) - self.max_chars} chars]"
+        record.msg = message
+        record.args = None
+        return True
+
+def parse_module_levels(spec: str) -> dict:
+    """
+    Parses "module=LEVEL,other.module=LEVEL" into a {logger name: level} dict.
+    """
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def configure_logging(level: str, module_levels: dict = None, max_message_chars: int = 500):
+    """
+    Routes every log record through a queue so request handlers never block on
+    the output stream; a background listener thread does the actual writing.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(PayloadPolicyFilter(max_message_chars))
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """
+    Flushes queued records; called on shutdown.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
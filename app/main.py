@@ -1,53 +1,369 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Header, Depends
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
+from typing import Optional
+from contextlib import asynccontextmanager
 import os
+import json
+import time
+import asyncio
 import uuid
+import hashlib
 import tempfile
 import logging
-from dotenv import load_dotenv
-from direct_pdf_extractor import DirectPDFExtractor
-from pitchdeck_agent import PitchDeckAgent
-from product_agent import ProductAgent
-from web_research_agent import WebResearchAgent
-from market_size_agent import MarketSizeAgent
-from report_generator_agent import ReportGeneratorAgent
-
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+import httpx
+from settings import get_settings
+from agent_registry import get_agent, loaded_agents
+from admission import AdmissionMiddleware, ConcurrencyLimiter
+from single_flight import SingleFlight
+from profiling import ProfileStore, ProfilingMiddleware
+from client_disconnect import CancelOnDisconnectMiddleware, disconnect_totals
+from logging_config import request_id_var, request_id_from_header, stop_logging
+from state_store import get_state_store
+from pdf_optimizer import optimization_totals, shutdown_process_pool
+from text_compactor import compact_text, compaction_totals
+from circuit_breaker import breaker_states, find_circuit_open
+from static_assets import StaticAssetStore
+
+settings = get_settings()
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="PDF Text Extractor")
+# Agent results are shared across worker processes so that any worker can
+# answer a follow-up request for a document another worker already analyzed
+state_store = get_state_store()
 
-# Handle static files path correctly
+# Static files are read and compressed once at startup and served from memory
 static_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
-app.mount("/static", StaticFiles(directory=static_path), name="static")
+static_assets = StaticAssetStore(static_path)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    static_assets.load()
+    purged = state_store.purge_expired()
+    logger.info(f"🗄️ Purged {purged} expired state entries")
+    yield
+    if "web_research" in loaded_agents():
+        await get_agent("web_research").aclose()
+    shutdown_process_pool()
+    state_store.close()
+    stop_logging()
+
+app = FastAPI(title="PDF Text Extractor", lifespan=lifespan)
+
+# Heavy endpoints get bounded concurrency and a bounded wait queue (limits are per worker)
+admission_limiters = {
+    path: ConcurrencyLimiter(path, max_concurrent, max_queue, queue_timeout)
+    for path, (max_concurrent, max_queue, queue_timeout) in settings.admission_limits.items()
+}
+# Unless configured separately, the streaming endpoints share the slots of their plain versions
+for stream_path, plain_path in (("/upload/stream", "/upload"), ("/generate_report/stream", "/generate_report")):
+    if stream_path not in admission_limiters:
+        admission_limiters[stream_path] = admission_limiters[plain_path]
+app.add_middleware(AdmissionMiddleware, limiters=admission_limiters)
+
+# Opt-in request profiling; runs outside admission control so queue time is included
+profile_store = ProfileStore(settings.profile_dir, settings.profile_retention)
+app.add_middleware(
+    ProfilingMiddleware,
+    store=profile_store,
+    admin_token=settings.admin_token,
+    sample_rate=settings.profile_sample_rate,
+    interval=settings.profile_interval_seconds
+)
+
+# Stop extraction and agent calls for analysts who closed the tab
+app.add_middleware(CancelOnDisconnectMiddleware, paths={
+    "/upload", "/upload/stream", "/analyze", "/analyze_product",
+    "/research_company", "/analyze_market_size", "/generate_report", "/generate_report/stream"
+})
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    # Honour an ID set by the client or proxy so lines can be joined across services
+    request_id = request_id_from_header(request.headers.get("x-request-id"))
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+# Cleanup tasks that must outlive a cancelled streaming response
+background_cleanups = set()
+
+# Early agent runs from /upload/stream whose results are stored after the stream closed
+background_results = set()
+
+# An analysis already running in this worker is joined instead of started again
+analysis_flights = SingleFlight()
 
-direct_pdf_extractor = DirectPDFExtractor()
-pitchdeck_agent = PitchDeckAgent()
-product_agent = ProductAgent()
-web_research_agent = WebResearchAgent()
-market_size_agent = MarketSizeAgent()
-report_generator_agent = ReportGeneratorAgent()
+# Last upstream readiness probe, reused for settings.readiness_cache_seconds
+upstream_readiness = {"checked_at": 0.0, "ready": False, "detail": "not checked"}
 
 class AnalyzeRequest(BaseModel):
-    extracted_text: str
+    # Either the document_id returned by /upload or the full extracted text
+    document_id: Optional[str] = None
+    extracted_text: Optional[str] = None
 
 class ReportRequest(BaseModel):
-    pitchdeck_analysis: str
-    product_analysis: str
-    web_research: str
-    market_analysis: str
-    company_name: str = None
+    # With a document_id the analyses are read from the server-side store
+    document_id: Optional[str] = None
+    pitchdeck_analysis: Optional[str] = None
+    product_analysis: Optional[str] = None
+    web_research: Optional[str] = None
+    market_analysis: Optional[str] = None
+    company_name: Optional[str] = None
+
+def text_cache_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def agent_text(extracted_text: str) -> str:
+    # The form of the text every agent receives
+    return compact_text(extracted_text)["text"] if settings.text_compaction else extracted_text
+
+def store_document(extracted_text: str, filename: str, company_name: str = None) -> tuple:
+    """
+    Returns (document ID, compaction stats or None).
+    """
+    # Documents are content-addressed, so the ID doubles as the agent result cache key
+    document_id = text_cache_key(extracted_text)
+    document = {
+        "filename": filename,
+        "company_name": company_name
+    }
+    text = extracted_text
+    compaction = None
+    if settings.text_compaction:
+        compacted = compact_text(extracted_text)
+        text = compacted["text"]
+        compaction = compacted["stats"]
+        compaction_totals["documents"] += 1
+        compaction_totals["original_chars"] += compaction["original_chars"]
+        compaction_totals["compact_chars"] += compaction["compact_chars"]
+        document.update(page_map=compacted["page_map"], compaction=compaction)
+    # The text agents receive is kept apart from the metadata, so a request only decodes what it reads
+    state_store.set("document_text", document_id, text, ttl=settings.document_ttl)
+    state_store.set("documents", document_id, document, ttl=settings.document_ttl)
+    return document_id, compaction
+
+def resolve_document(request: AnalyzeRequest) -> tuple:
+    """
+    Returns (cache key, extracted text) for a request carrying either a document ID or raw text.
+    """
+    if request.document_id:
+        text = state_store.get("document_text", request.document_id)
+        if text is None:
+            raise HTTPException(status_code=404, detail="Document not found or expired, please upload the PDF again")
+        return request.document_id, text
+    
+    if request.extracted_text:
+        return text_cache_key(request.extracted_text), agent_text(request.extracted_text)
+    
+    raise HTTPException(status_code=400, detail="Either document_id or extracted_text is required")
+
+def format_research(research: dict) -> str:
+    # Same shape the browser used to send for the web research section
+    return f"Company: {research['company_name']}\n\n{research['research_content']}"
+
+def load_report_inputs(document_id: str) -> dict:
+    if state_store.get("documents", document_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found or expired, please upload the PDF again")
+    
+    pitchdeck_analysis = state_store.get("pitchdeck_analysis", document_id)
+    product_analysis = state_store.get("product_analysis", document_id)
+    web_research = state_store.get("web_research", document_id)
+    market_result = state_store.get("market_analysis", document_id)
+    
+    missing = [
+        name for name, result in (
+            ("pitchdeck", pitchdeck_analysis),
+            ("product", product_analysis),
+            ("web_research", web_research),
+            ("market_size", market_result)
+        ) if result is None
+    ]
+    if missing:
+        raise HTTPException(status_code=409, detail=f"Analyses not completed yet: {', '.join(missing)}")
+    
+    return {
+        "pitchdeck_analysis": pitchdeck_analysis,
+        "product_analysis": product_analysis,
+        "web_research": format_research(web_research),
+        "market_analysis": market_result["market_analysis"],
+        "company_name": web_research["company_name"]
+    }
+
+async def cached_result(namespace: str, cache_key: str, extracted_text: str, compute, limiter: ConcurrencyLimiter = None):
+    """
+    Returns the stored result, or computes and stores it. A limiter is given when the
+    caller does not already hold a slot of the endpoint that owns the computation.
+    """
+    result = state_store.get(namespace, cache_key)
+    if result is not None:
+        logger.info(f"♻️ Serving cached {namespace} result")
+        return result
+    
+    async def run():
+        if limiter is None:
+            result = await compute(extracted_text)
+        else:
+            async with limiter.slot():
+                result = await compute(extracted_text)
+        # A degraded result (e.g. without web research) is replaced as soon as the provider recovers
+        degraded = isinstance(result, dict) and result.get("degraded")
+        state_store.set(namespace, cache_key, result, ttl=settings.degraded_result_ttl if degraded else settings.analysis_cache_ttl)
+        return result
+    
+    return await analysis_flights.run(f"{namespace}:{cache_key}", run)
+
+async def research_result(cache_key: str, extracted_text: str, limiter: ConcurrencyLimiter = None) -> dict:
+    # /upload/stream may already have extracted the company name from the first pages
+    company_name = (state_store.get("documents", cache_key) or {}).get("company_name")
+    research_agent = get_agent("web_research")
+    return await cached_result(
+        "web_research", cache_key, extracted_text,
+        lambda text: research_agent.full_research(text, company_name),
+        limiter
+    )
+
+async def market_analysis_result(cache_key: str, extracted_text: str, limiter: ConcurrencyLimiter = None) -> dict:
+    market_result = state_store.get("market_analysis", cache_key)
+    if market_result is not None:
+        return market_result
+    
+    async def run():
+        if limiter is None:
+            market_result = await get_agent("market_size").full_market_analysis(extracted_text)
+        else:
+            async with limiter.slot():
+                market_result = await get_agent("market_size").full_market_analysis(extracted_text)
+        # Failures are not cached so that the next attempt retries the web search, and
+        # an analysis missing part of its research is replaced once the search recovers
+        if market_result["success"]:
+            ttl = settings.degraded_result_ttl if market_result.get("degraded") else settings.analysis_cache_ttl
+            state_store.set("market_analysis", cache_key, market_result, ttl=ttl)
+        return market_result
+    
+    return await analysis_flights.run(f"market_analysis:{cache_key}", run)
+
+def upstream_error(error: Exception, message: str) -> HTTPException:
+    # While a provider's circuit is open, fail fast with 503 so clients back off
+    circuit = find_circuit_open(error)
+    if circuit is not None:
+        return HTTPException(
+            status_code=503,
+            detail=f"{message}: {str(circuit)}",
+            headers={"Retry-After": str(circuit.retry_after)}
+        )
+    return HTTPException(status_code=500, detail=f"{message}: {str(error)}")
+
+async def check_upstream_readiness() -> dict:
+    if time.monotonic() - upstream_readiness["checked_at"] < settings.readiness_cache_seconds:
+        return upstream_readiness
+    
+    try:
+        async with httpx.AsyncClient(timeout=settings.readiness_timeout_seconds) as client:
+            response = await client.get(
+                "https://api.openai.com/v1/models",
+                headers={"Authorization": f"Bearer {settings.openai_api_key}"}
+            )
+        ready = response.status_code == 200
+        detail = "ok" if ready else f"OpenAI API returned {response.status_code}"
+    except Exception as e:
+        ready = False
+        detail = f"OpenAI API unreachable: {str(e)}"
+    
+    upstream_readiness.update(checked_at=time.monotonic(), ready=ready, detail=detail)
+    return upstream_readiness
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    checks = {
+        "openai_api_key": "ok" if settings.openai_api_key else "missing",
+        # Perplexity is only needed by the web research agent, so it never blocks readiness
+        "perplexity_api_key": "ok" if settings.perplexity_api_key else "missing (web research disabled)"
+    }
+    
+    try:
+        state_store.get("health", "probe")
+        checks["state_store"] = "ok"
+    except Exception as e:
+        checks["state_store"] = f"error: {str(e)}"
+    
+    if settings.readiness_check_upstream and settings.openai_api_key:
+        checks["openai_api"] = (await check_upstream_readiness())["detail"]
+    
+    ready = all(
+        checks[name] == "ok"
+        for name in ("openai_api_key", "state_store", "openai_api")
+        if name in checks
+    )
+    
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not ready",
+            "checks": checks,
+            "loaded_agents": loaded_agents()
+        }
+    )
+
+@app.get("/metrics")
+async def metrics():
+    # Imported here so that importing main does not load the OpenAI SDK before an agent needs it
+    from model_router import get_model_router
+    
+    return {
+        "pid": os.getpid(),
+        "admission": {path: limiter.stats() for path, limiter in admission_limiters.items() if limiter.name == path},
+        "pdf_optimization": optimization_totals,
+        "text_compaction": {
+            **compaction_totals,
+            "compression_ratio": round(compaction_totals["compact_chars"] / compaction_totals["original_chars"], 3)
+            if compaction_totals["original_chars"] else None
+        },
+        "client_disconnects": disconnect_totals,
+        "analyses_in_flight": analysis_flights.in_flight(),
+        "model_routes": get_model_router().summary(),
+        "circuit_breakers": breaker_states()
+    }
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token != settings.admin_token:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    return {"profiles": await asyncio.to_thread(profile_store.list)}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    profile = await asyncio.to_thread(profile_store.read, profile_id, ".json")
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return JSONResponse(content=json.loads(profile))
+
+@app.get("/admin/profiles/{profile_id}/folded", dependencies=[Depends(require_admin)])
+async def get_profile_stacks(profile_id: str):
+    stacks = await asyncio.to_thread(profile_store.read, profile_id, ".folded")
+    if stacks is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(stacks)
 
 @app.get("/", response_class=HTMLResponse)
-async def read_root():
-    html_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "index.html")
-    with open(html_path, "r") as f:
-        return HTMLResponse(content=f.read())
+async def read_root(request: Request):
+    return static_assets.response("index.html", request)
+
+@app.get("/static/{file_name}")
+async def read_static(file_name: str, request: Request):
+    return static_assets.response(file_name, request)
 
 @app.post("/upload")
 async def upload_pdf(file: UploadFile = File(...)):
@@ -74,36 +390,157 @@ async def upload_pdf(file: UploadFile = File(...)):
         
         # Direct PDF processing using OpenAI Responses API
         logger.info("🔄 Starting PDF text extraction...")
-        extracted_text = await direct_pdf_extractor.extract_text_from_pdf(file_path)
+        extracted_text, degraded = await get_agent("pdf_extractor").extract_text_from_pdf(file_path)
         
         logger.info(f"✅ PDF extraction completed, text length: {len(extracted_text)}")
         
-        # Clean up temporary file
-        os.unlink(file_path)
-        logger.info("🗑️ Cleaned up temporary file")
+        document_id, compaction = store_document(extracted_text, file.filename)
+        logger.info(f"🗄️ Stored document {document_id}")
         
         return JSONResponse(content={
             "success": True,
-            "extracted_text": extracted_text
+            "document_id": document_id,
+            "extracted_text": extracted_text,
+            "compaction": compaction,
+            # Some pages were read from the PDF text layer: text in images and scans is missing
+            "degraded": degraded
         })
     
     except Exception as e:
         logger.error(f"❌ Error processing PDF: {str(e)}")
-        
-        # Clean up temporary file if it exists
+        raise upstream_error(e, "Error processing PDF")
+    
+    finally:
+        # Also runs when the request is cancelled because the client disconnected
         if temp_file and os.path.exists(temp_file.name):
             try:
                 os.unlink(temp_file.name)
-                logger.info("🗑️ Cleaned up temporary file after error")
+                logger.info("🗑️ Cleaned up temporary file")
             except Exception as cleanup_error:
                 logger.warning(f"⚠️ Failed to cleanup temporary file: {cleanup_error}")
+
+@app.post("/upload/stream")
+async def upload_pdf_stream(file: UploadFile = File(...)):
+    """
+    Streaming variant of /upload. Responds with NDJSON events:
+    - {"type": "chunk", ...} for each extracted chunk, in page order
+    - {"type": "done", "document_id": ..., "extracted_text": ...} once the full text is stored,
+      with the chunks merged exactly as /upload returns them, then the stream closes
+    - {"type": "error", "detail": ...} if extraction fails
+    """
+    logger.info(f"📁 Received streaming file upload: {file.filename}")
+    
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    
+    # The upload must be persisted before the response starts streaming
+    content = await file.read()
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+        temp_file.write(content)
+        file_path = temp_file.name
+    logger.info(f"📁 Wrote {len(content)} bytes to temporary file {file_path}")
+    
+    return StreamingResponse(
+        stream_extraction(file_path, file.filename),
+        media_type="application/x-ndjson"
+    )
+
+async def stream_extraction(file_path: str, filename: str):
+    extractor = get_agent("pdf_extractor")
+    chunk_stream = extractor.iter_text_chunks(file_path)
+    chunks = []
+    early_tasks = {}
+    try:
+        async for chunk in chunk_stream:
+            chunks.append(chunk)
+            yield json.dumps({"type": "chunk", **chunk}) + "\n"
+            
+            if chunk["index"] == 0:
+                # The company name mostly comes from the first pages, so extract it
+                # while later chunks are still extracting
+                first_pages = agent_text(chunk["text"])
+                early_tasks["company_name"] = asyncio.create_task(
+                    get_agent("web_research").extract_company_name(first_pages)
+                )
+                # Only a single-chunk document is fully seen by an analysis of its first chunk
+                if chunk["total"] == 1:
+                    early_tasks["pitchdeck"] = asyncio.create_task(
+                        get_agent("pitchdeck").analyze_pitchdeck(first_pages)
+                    )
         
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+        extracted_text = extractor.merge_chunks(chunks)
+        logger.info(f"✅ PDF extraction completed, text length: {len(extracted_text)}")
+        
+        company_name = None
+        company_task = early_tasks.get("company_name")
+        if company_task is not None and company_task.done() and not company_task.exception():
+            company_name = company_task.result()
+            early_tasks.pop("company_name")
+        
+        document_id, compaction = store_document(extracted_text, filename, company_name)
+        logger.info(f"🗄️ Stored document {document_id}")
+        
+        # Early runs still in flight finish after the stream closes, so the upload
+        # does not hold its admission slot for them
+        for agent_name, task in early_tasks.items():
+            stored = asyncio.ensure_future(store_early_result(agent_name, task, document_id))
+            background_results.add(stored)
+            stored.add_done_callback(background_results.discard)
+        early_tasks = {}
+        
+        yield json.dumps({
+            "type": "done",
+            "document_id": document_id,
+            "extracted_text": extracted_text,
+            "total_chunks": len(chunks),
+            "compaction": compaction,
+            "degraded": any(chunk["degraded"] for chunk in chunks)
+        }) + "\n"
+    
+    except Exception as e:
+        logger.error(f"❌ Error processing PDF: {str(e)}")
+        yield json.dumps({"type": "error", "detail": f"Error processing PDF: {str(e)}"}) + "\n"
+    
+    finally:
+        for task in early_tasks.values():
+            task.cancel()
+        # On disconnect the stream is cancelled repeatedly while it unwinds, so
+        # the cleanup runs as its own task that finishes regardless
+        cleanup = asyncio.ensure_future(cleanup_extraction(chunk_stream, file_path))
+        background_cleanups.add(cleanup)
+        cleanup.add_done_callback(background_cleanups.discard)
+        await asyncio.shield(cleanup)
+
+async def store_early_result(agent_name: str, task: asyncio.Task, document_id: str):
+    try:
+        result = await task
+    except Exception as e:
+        logger.warning(f"⚠️ Early {agent_name} run failed: {str(e)}")
+        return
+    
+    if agent_name == "company_name":
+        document = state_store.get("documents", document_id)
+        if document is not None:
+            document["company_name"] = result
+            state_store.set("documents", document_id, document, ttl=settings.document_ttl)
+    elif agent_name == "pitchdeck":
+        state_store.set("pitchdeck_analysis", document_id, result, ttl=settings.analysis_cache_ttl)
+    logger.info(f"🗄️ Stored early {agent_name} result for {document_id}")
+
+async def cleanup_extraction(chunk_stream, file_path: str):
+    # Stops the remaining chunks and waits for their uploads to be deleted
+    await chunk_stream.aclose()
+    try:
+        os.unlink(file_path)
+        logger.info("🗑️ Cleaned up temporary file")
+    except Exception as cleanup_error:
+        logger.warning(f"⚠️ Failed to cleanup temporary file: {cleanup_error}")
 
 @app.post("/analyze")
 async def analyze_pitchdeck(request: AnalyzeRequest):
+    cache_key, extracted_text = resolve_document(request)
     try:
-        analysis = await pitchdeck_agent.analyze_pitchdeck(request.extracted_text)
+        analysis = await cached_result("pitchdeck_analysis", cache_key, extracted_text, get_agent("pitchdeck").analyze_pitchdeck)
         
         return JSONResponse(content={
             "success": True,
@@ -111,12 +548,13 @@ async def analyze_pitchdeck(request: AnalyzeRequest):
         })
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error analyzing pitch deck: {str(e)}")
+        raise upstream_error(e, "Error analyzing pitch deck")
 
 @app.post("/analyze_product")
 async def analyze_product(request: AnalyzeRequest):
+    cache_key, extracted_text = resolve_document(request)
     try:
-        analysis = await product_agent.analyze_product(request.extracted_text)
+        analysis = await cached_result("product_analysis", cache_key, extracted_text, get_agent("product").analyze_product)
         
         return JSONResponse(content={
             "success": True,
@@ -124,49 +562,69 @@ async def analyze_product(request: AnalyzeRequest):
         })
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error analyzing product: {str(e)}")
+        raise upstream_error(e, "Error analyzing product")
 
 @app.post("/research_company")
 async def research_company(request: AnalyzeRequest):
+    cache_key, extracted_text = resolve_document(request)
     try:
-        research_result = await web_research_agent.full_research(request.extracted_text)
+        result = await research_result(cache_key, extracted_text)
         
         return JSONResponse(content={
             "success": True,
-            "company_name": research_result["company_name"],
-            "research_content": research_result["research_content"]
+            "company_name": result["company_name"],
+            "research_content": result["research_content"],
+            "degraded": result.get("degraded", False)
         })
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error researching company: {str(e)}")
+        raise upstream_error(e, "Error researching company")
 
 @app.post("/analyze_market_size")
 async def analyze_market_size(request: AnalyzeRequest):
+    cache_key, extracted_text = resolve_document(request)
     try:
-        market_result = await market_size_agent.full_market_analysis(request.extracted_text)
+        market_result = await market_analysis_result(cache_key, extracted_text)
         
         if market_result["success"]:
             return JSONResponse(content={
                 "success": True,
                 "extracted_info": market_result.get("extracted_text", ""),
-                "market_analysis": market_result["market_analysis"]
+                "market_analysis": market_result["market_analysis"],
+                "degraded": market_result.get("degraded", False)
             })
+        elif market_result.get("retry_after"):
+            raise HTTPException(
+                status_code=503,
+                detail=market_result.get("message", "Market analysis failed"),
+                headers={"Retry-After": str(market_result["retry_after"])}
+            )
         else:
             raise HTTPException(status_code=500, detail=market_result.get("message", "Market analysis failed"))
     
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error analyzing market size: {str(e)}")
+        raise upstream_error(e, "Error analyzing market size")
 
 @app.post("/generate_report")
 async def generate_report(request: ReportRequest):
+    if request.document_id:
+        report_inputs = load_report_inputs(request.document_id)
+    else:
+        report_inputs = {
+            "pitchdeck_analysis": request.pitchdeck_analysis,
+            "product_analysis": request.product_analysis,
+            "web_research": request.web_research,
+            "market_analysis": request.market_analysis,
+            "company_name": request.company_name
+        }
+        missing = [name for name, value in report_inputs.items() if value is None and name != "company_name"]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Missing analyses: {', '.join(missing)}")
+    
     try:
-        comprehensive_report = await report_generator_agent.generate_complete_report(
-            pitchdeck_analysis=request.pitchdeck_analysis,
-            product_analysis=request.product_analysis,
-            web_research=request.web_research,
-            market_analysis=request.market_analysis,
-            company_name=request.company_name
-        )
+        comprehensive_report = await get_agent("report_generator").generate_complete_report(**report_inputs)
         
         return JSONResponse(content={
             "success": True,
@@ -174,7 +632,137 @@ async def generate_report(request: ReportRequest):
         })
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating comprehensive report: {str(e)}")
+        raise upstream_error(e, "Error generating comprehensive report")
+
+@app.post("/generate_report/stream")
+async def generate_report_stream(request: ReportRequest):
+    """
+    Streams the report as NDJSON while the analyses finish: every finished analysis
+    is placed in its section right away and the executive summary and strategic
+    insights are revised after it. Analyses not run yet are started here.
+    """
+    if not request.document_id:
+        raise HTTPException(status_code=400, detail="document_id is required")
+    
+    document_id, extracted_text = resolve_document(AnalyzeRequest(document_id=request.document_id))
+    company_name = (state_store.get("documents", document_id) or {}).get("company_name")
+    
+    return StreamingResponse(
+        stream_report(document_id, extracted_text, company_name),
+        media_type="application/x-ndjson"
+    )
+
+def report_section_sources(document_id: str, extracted_text: str) -> dict:
+    """
+    Report input -> coroutine returning its section text (cached results return at once).
+    An analysis computed here takes a slot of the endpoint that normally runs it, so the
+    report stream stays within e.g. the /analyze_market_size limit.
+    """
+    async def pitchdeck():
+        return await cached_result(
+            "pitchdeck_analysis", document_id, extracted_text, get_agent("pitchdeck").analyze_pitchdeck,
+            admission_limiters["/analyze"]
+        )
+    
+    async def product():
+        return await cached_result(
+            "product_analysis", document_id, extracted_text, get_agent("product").analyze_product,
+            admission_limiters["/analyze_product"]
+        )
+    
+    async def web_research():
+        return await research_result(document_id, extracted_text, admission_limiters["/research_company"])
+    
+    async def market():
+        market_result = await market_analysis_result(document_id, extracted_text, admission_limiters["/analyze_market_size"])
+        if not market_result["success"]:
+            raise Exception(market_result.get("message", "Market analysis failed"))
+        return market_result["market_analysis"]
+    
+    return {
+        "pitchdeck_analysis": pitchdeck(),
+        "product_analysis": product(),
+        "web_research": web_research(),
+        "market_analysis": market()
+    }
+
+async def stream_report(document_id: str, extracted_text: str, company_name: str = None):
+    report_agent = get_agent("report_generator")
+    sections = {}
+    errors = {}
+    
+    section_tasks = {
+        asyncio.ensure_future(source): name
+        for name, source in report_section_sources(document_id, extracted_text).items()
+    }
+    # The synthesis of an earlier report on this document is reused for unchanged sections
+    synthesis = state_store.get("report_synthesis", document_id)
+    synthesis_task = None
+    synthesis_inputs = {}
+    failed_synthesis = None
+    
+    def section_keys(current: dict) -> dict:
+        # A failed synthesis is only retried once its inputs changed
+        return {name: text_cache_key(text) for name, text in current.items()}
+    
+    def report_event(event_type: str, **fields) -> str:
+        report = report_agent.assemble_report(sections, synthesis, company_name, errors)
+        return json.dumps({"type": event_type, **fields, "completed": sorted(sections), "report": report}) + "\n"
+    
+    try:
+        while section_tasks or synthesis_task is not None:
+            pending = set(section_tasks) | ({synthesis_task} if synthesis_task is not None else set())
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            
+            for task in done:
+                if task is synthesis_task:
+                    synthesis_task = None
+                    try:
+                        synthesis = task.result()
+                    except Exception as e:
+                        logger.warning(f"⚠️ Report synthesis failed: {str(e)}")
+                        failed_synthesis = section_keys(synthesis_inputs)
+                        yield json.dumps({"type": "synthesis_error", "detail": str(e)}) + "\n"
+                        continue
+                    state_store.set("report_synthesis", document_id, synthesis, ttl=settings.analysis_cache_ttl)
+                    yield report_event("synthesis")
+                    continue
+                
+                name = section_tasks.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logger.warning(f"⚠️ Report section {name} failed: {str(e)}")
+                    errors[name] = str(e)
+                    yield report_event("section_error", section=name, detail=str(e))
+                    continue
+                
+                if name == "web_research":
+                    company_name = result["company_name"]
+                    result = format_research(result)
+                sections[name] = result
+                yield report_event("section", section=name)
+            
+            # One synthesis call at a time; sections that finish meanwhile go into the next one
+            if synthesis_task is None and sections and report_agent.synthesis_outdated(synthesis, sections) \
+                    and section_keys(sections) != failed_synthesis:
+                synthesis_inputs = dict(sections)
+                synthesis_task = asyncio.ensure_future(
+                    report_agent.update_synthesis(synthesis_inputs, company_name, synthesis)
+                )
+        
+        logger.info(f"✅ Progressive report completed: {len(sections)} sections, {len(errors)} failed")
+        yield report_event("done", complete=not errors and synthesis is not None)
+    
+    except Exception as e:
+        logger.error(f"❌ Error generating progressive report: {str(e)}")
+        yield json.dumps({"type": "error", "detail": f"Error generating comprehensive report: {str(e)}"}) + "\n"
+    
+    finally:
+        for task in section_tasks:
+            task.cancel()
+        if synthesis_task is not None:
+            synthesis_task.cancel()
 
 if __name__ == "__main__":
     import uvicorn
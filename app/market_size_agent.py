@@ -1,16 +1,229 @@
 import openai
-import os
+import time
+import asyncio
 import logging
-from dotenv import load_dotenv
+from settings import get_settings
+from model_router import get_model_router
+from research_cache import ResearchCache, normalize_market_query
+from circuit_breaker import find_circuit_open
 
-load_dotenv()
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Independent slices of the market research, searched concurrently in parallel mode.
+# facet -> (section title, what to search for)
+RESEARCH_FACETS = {
+    "tam": (
+        "TOTAL MARKET SIZE",
+        """- How the market is usually defined and segmented
+- Global and regional market sizes with $ amount, year and source
+- CAGR and growth drivers with source"""
+    ),
+    "sam": (
+        "SEGMENT DATA",
+        """- Sizes of the relevant customer segments and the main geography with $ amount, year and source
+- Number of potential customers in that segment and typical spend per customer, with source"""
+    ),
+    "competitors": (
+        "COMPETITORS & BENCHMARKS",
+        """- Main competitors and their revenue, funding, customer counts or market share where available
+- Benchmark market shares reached by comparable companies, with source"""
+    ),
+}
+
 class MarketSizeAgent:
     def __init__(self):
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = openai.AsyncOpenAI(api_key=get_settings().openai_api_key)
+        self.model_router = get_model_router()
+        # Sector-level web research is shared by every deck in the same market
+        self.research_cache = ResearchCache(
+            "market_research",
+            get_settings().market_research_cache_ttl,
+            get_settings().market_research_cache_stale
+        )
+        self.parallel_research = get_settings().market_research_mode == "parallel"
+        # The presentation every market analysis ends up in
+        self.presentation_format = """# 📊 Market Size Analysis
+
+### 🌍 TAM (Total Addressable Market)
+**Market Size:** [Bold the $ amount and year]
+[Clean explanation - 3 bullet points]
+
+[Sources with links]
+
+### 🎯 SAM (Serviceable Available Market)
+**Market Size:** [Bold the $ amount and year]
+[Clean explanation - 3 bullet points]
+
+[Sources with links]
+
+### 🔥 SOM (Serviceable Obtainable Market)
+**Market Size:** [Bold the $ amount and year]
+[Clean explanation - 3 bullet points]
+**Market Share Assumptions:** [Bold the percentage]
+
+[Sources with links]
+
+## 💡 Key Insights
+[Professional insights formatted as short paragraphs]"""
+        self.market_query_prompt = """You identify the market a startup competes in. Read the pitch deck and return ONE short market research query describing:
+- the product category
+- the target customer segment
+- the main geography
+
+Return ONLY the query on a single line, nothing else.
+
+Example outputs:
+- "B2B payroll software for SMEs in Brazil"
+- "Consumer telehealth for mental health in the United States"
+"""
+
+    async def extract_market_query(self, extracted_text: str) -> str:
+        """
+        Reduce the pitch deck to a short market query used as the research cache key.
+        """
+        response = await self.model_router.call(
+            "market_size.market_query",
+            extracted_text,
+            lambda model: self.client.chat.completions.create(
+                model=model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": self.market_query_prompt
+                    },
+                    {
+                        "role": "user",
+                        "content": extracted_text
+                    }
+                ],
+                temperature=0
+            )
+        )
+        
+        market_query = response.choices[0].message.content.strip().strip('"')
+        logger.info(f"🎯 Market query: {market_query}")
+        return market_query
+
+    async def research_market(self, market_query: str) -> dict:
+        """
+        Web-search market data for a market query as {"content", "missing_facets"},
+        served from the shared cache when fresh.
+        """
+        if self.parallel_research:
+            return await self.research_market_facets(market_query)
+        
+        content = await self.research_cache.get_or_compute(
+            normalize_market_query(market_query),
+            lambda: self.fetch_market_research(market_query)
+        )
+        return {"content": content, "missing_facets": []}
+
+    async def research_market_facets(self, market_query: str) -> dict:
+        """
+        Researches every facet concurrently (each cached on its own), so the latency
+        is that of the slowest facet rather than one search covering all of them.
+        """
+        cache_key = normalize_market_query(market_query)
+        facets = list(RESEARCH_FACETS)
+        results = await asyncio.gather(*(
+            self.research_cache.get_or_compute(
+                f"{cache_key}|{facet}",
+                lambda facet=facet: self.fetch_facet_research(market_query, facet)
+            )
+            for facet in facets
+        ), return_exceptions=True)
+        
+        sections = []
+        failed = []
+        for facet, result in zip(facets, results):
+            title = RESEARCH_FACETS[facet][0]
+            if isinstance(result, Exception):
+                logger.warning(f"⚠️ Market research facet '{facet}' failed: {str(result)}")
+                failed.append(facet)
+                sections.append(f"## {title}\nNo data available.")
+            else:
+                sections.append(f"## {title}\n{result}")
+        
+        if len(failed) == len(facets):
+            raise results[0]
+        
+        return {"content": "\n\n".join(sections), "missing_facets": failed}
+
+    async def fetch_facet_research(self, market_query: str, facet: str) -> str:
+        title, topics = RESEARCH_FACETS[facet]
+        logger.info(f"🌐 Researching market facet '{facet}' with web search: {market_query}")
+        
+        prompt = f"""You are a senior market research analyst with access to real-time web search.
+
+TASK: Collect current {title.lower()} data for this market: {market_query}
+
+Search the web for recent industry reports and market studies and report ONLY:
+{topics}
+
+RULES:
+- Report figures exactly as published, always with the source, year and URL
+- Do not estimate a specific company's share; only report market-level data
+- Answer with concise bullet points, without headings or introduction"""
+
+        response = await self.model_router.call(
+            "market_size.facet_research",
+            prompt,
+            lambda model: self.client.responses.create(
+                model=model,
+                tools=[{"type": "web_search_preview"}],
+                input=prompt
+            )
+        )
+        
+        facet_research = response.output_text
+        logger.info(f"✅ Market facet '{facet}' research completed. Length: {len(facet_research)} characters")
+        return facet_research
+
+    async def fetch_market_research(self, market_query: str) -> str:
+        logger.info(f"🌐 Researching market with web search: {market_query}")
+        
+        prompt = f"""You are a senior market research analyst with access to real-time web search.
+
+TASK: Collect current market sizing data for this market: {market_query}
+
+INSTRUCTIONS:
+1. Search the web for recent industry reports, market studies and competitor information
+2. Report figures exactly as published, always with the source and year
+3. Do not estimate a specific company's share; only report market-level data
+
+OUTPUT FORMAT:
+
+## MARKET DEFINITION
+[How the market is usually defined and segmented]
+
+## TOTAL MARKET SIZE
+- [Global and regional market sizes with $ amount, year and source]
+
+## SEGMENT DATA
+- [Sizes of the relevant customer segments / geographies with $ amount, year and source]
+
+## GROWTH
+- [CAGR and growth drivers with source]
+
+## COMPETITORS & BENCHMARKS
+- [Main competitors, their revenue / funding / market share where available]
+
+## DATA SOURCES
+[List web sources used with titles and URLs]"""
+
+        response = await self.model_router.call(
+            "market_size.web_research",
+            prompt,
+            lambda model: self.client.responses.create(
+                model=model,
+                tools=[{"type": "web_search_preview"}],
+                input=prompt
+            )
+        )
+        
+        market_research = response.output_text
+        logger.info(f"✅ Market research completed. Length: {len(market_research)} characters")
+        return market_research
 
     async def format_analysis(self, raw_analysis: str) -> str:
         """
@@ -45,50 +258,32 @@ YOU MUST FOLLOW THE OUTPUT FORMAT BELOW.
 
 OUTPUT FORMAT:
 
-# 📊 Market Size Analysis
-
-### 🌍 TAM (Total Addressable Market)
-**Market Size:** [Bold the $ amount and year]
-[Clean explanation - 3 bullet points]
-
-[Sources with links]
-
-### 🎯 SAM (Serviceable Available Market)
-**Market Size:** [Bold the $ amount and year]
-[Clean explanation - 3 bullet points]
-
-[Sources with links]
-
-### 🔥 SOM (Serviceable Obtainable Market)
-**Market Size:** [Bold the $ amount and year]
-[Clean explanation - 3 bullet points]
-**Market Share Assumptions:** [Bold the percentage]
-
-[Sources with links]
-
-## 💡 Key Insights
-[Professional insights formatted as short paragraphs]"""
-
-            # Format the analysis using GPT-5
-            response = self.client.chat.completions.create(
-                model="gpt-5",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert presentation formatter. Transform raw business analysis into beautiful, professional presentations."
-                    },
-                    {
-                        "role": "user",
-                        "content": formatting_prompt
-                    }
-                ]
+{self.presentation_format}"""
+
+            # Format the analysis (GPT-5 unless routed otherwise)
+            response = await self.model_router.call(
+                "market_size.format",
+                formatting_prompt,
+                lambda model: self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "You are an expert presentation formatter. Transform raw business analysis into beautiful, professional presentations."
+                        },
+                        {
+                            "role": "user",
+                            "content": formatting_prompt
+                        }
+                    ]
+                )
             )
             
             formatted_analysis = response.choices[0].message.content
             
             logger.info(f"✅ Analysis formatting completed")
             logger.info(f"📊 Formatted length: {len(formatted_analysis)} characters")
-            logger.info(f"📄 Preview: {formatted_analysis[:200]}...")
+            logger.debug(f"📄 Preview: {formatted_analysis[:200]}...")
             
             return formatted_analysis
             
@@ -106,21 +301,40 @@ OUTPUT FORMAT:
             logger.info("🚀 Starting market size analysis with web search...")
             logger.info(f"📄 Analyzing text length: {len(extracted_text)} characters")
             
-            # Comprehensive prompt that combines extraction and analysis
-            prompt = f"""You are a senior market research analyst with access to real-time web search. 
-
-TASK: Analyze the following pitch deck content and provide a comprehensive market sizing analysis.
-
-PITCH DECK CONTENT:
-{extracted_text}
+            timings = {}
+            start = time.monotonic()
+            market_research = None
+            missing_facets = []
+            if self.research_cache.enabled or self.parallel_research:
+                # Research mode: the web search covers the market, not the deck, so
+                # decks from the same sector reuse it; only the sizing is per deck
+                market_query = await self.extract_market_query(extracted_text)
+                timings["market_query"] = time.monotonic() - start
+                research = await self.research_market(market_query)
+                market_research = research["content"]
+                missing_facets = research["missing_facets"]
+                timings["research"] = time.monotonic() - start - timings["market_query"]
+                instructions = f"""MARKET RESEARCH (collected with web search):
+{market_research}
 
 INSTRUCTIONS:
 1. First, extract key product and company information from the pitch deck
+2. Then use the market research above for market data, industry reports, and competitor information
+3. Provide a detailed TAM/SAM/SOM analysis based on that data
+4. Only cite sources that appear in the market research"""
+                # The sizing call writes the final presentation itself, so research mode
+                # has no separate formatting call on its critical path
+                output_format = f"""OUTPUT FORMAT:
+Bold important numbers, percentages and market sizes, use bullet points and keep paragraphs concise. YOU MUST FOLLOW THIS FORMAT:
+
+{self.presentation_format}"""
+            else:
+                instructions = """INSTRUCTIONS:
+1. First, extract key product and company information from the pitch deck
 2. Then search the web for current market data, industry reports, and competitor information
 3. Provide a detailed TAM/SAM/SOM analysis with real-time market data
-3. Use web search to help you with this taks, epecially to get data
-
-OUTPUT FORMAT:
+3. Use web search to help you with this taks, epecially to get data"""
+                output_format = """OUTPUT FORMAT:
 Provide a comprehensive analysis with these sections:
 
 ## PRODUCT & COMPANY SUMMARY
@@ -145,48 +359,96 @@ Provide a comprehensive analysis with these sections:
 - Write your own insights about the analysis. (1 paragaph)
 
 ## DATA SOURCES
-[List web sources used with titles and URLs]
+[List web sources used with titles and URLs]"""
+            
+            # Comprehensive prompt that combines extraction and analysis
+            prompt = f"""You are a senior market research analyst with access to real-time web search. 
 
-IMPORTANT: Use web search to find the most current market data available"""
+TASK: Analyze the following pitch deck content and provide a comprehensive market sizing analysis.
 
-            # Make web search API call
-            response = self.client.responses.create(
-                model="gpt-5",
-                tools=[{"type": "web_search_preview"}],
-                input=prompt
-            )
-            
-            # Get the raw analysis result
-            raw_analysis = response.output_text
-            
-            logger.info(f"✅ Raw market analysis completed")
-            logger.info(f"📊 Raw analysis length: {len(raw_analysis)} characters")
-            logger.info(f"📄 Raw preview: {raw_analysis[:200]}...")
+PITCH DECK CONTENT:
+{extracted_text}
+
+{instructions}
+
+{output_format}
+
+IMPORTANT: Use the most current market data available"""
+
+            sizing_start = time.monotonic()
+            # Web search is only needed when no cached market research was supplied
+            if market_research:
+                response = await self.model_router.call(
+                    "market_size.sizing",
+                    prompt,
+                    lambda model: self.client.responses.create(
+                        model=model,
+                        input=prompt
+                    )
+                )
+                formatted_analysis = response.output_text
+                timings["sizing"] = time.monotonic() - sizing_start
+            else:
+                response = await self.model_router.call(
+                    "market_size.web_research",
+                    prompt,
+                    lambda model: self.client.responses.create(
+                        model=model,
+                        tools=[{"type": "web_search_preview"}],
+                        input=prompt
+                    )
+                )
+                timings["web_research"] = time.monotonic() - sizing_start
+                
+                # Get the raw analysis result
+                raw_analysis = response.output_text
+                
+                logger.info(f"✅ Raw market analysis completed")
+                logger.info(f"📊 Raw analysis length: {len(raw_analysis)} characters")
+                logger.debug(f"📄 Raw preview: {raw_analysis[:200]}...")
+                
+                # Step 2: Format the analysis for beautiful presentation
+                logger.info("🎨 Starting formatting pipeline...")
+                format_start = time.monotonic()
+                formatted_analysis = await self.format_analysis(raw_analysis)
+                timings["format"] = time.monotonic() - format_start
             
-            # Step 2: Format the analysis for beautiful presentation
-            logger.info("🎨 Starting formatting pipeline...")
-            formatted_analysis = await self.format_analysis(raw_analysis)
+            timings = {phase: round(seconds, 2) for phase, seconds in timings.items()}
+            timings["total"] = round(time.monotonic() - start, 2)
             
             logger.info(f"✅ Complete market analysis pipeline finished")
+            logger.info(f"⏱️ Market analysis phases: {', '.join(f'{phase} {seconds}s' for phase, seconds in timings.items())}")
             logger.info(f"📊 Final formatted analysis length: {len(formatted_analysis)} characters")
-            logger.info(f"📄 Formatted preview: {formatted_analysis[:200]}...")
+            logger.debug(f"📄 Formatted preview: {formatted_analysis[:200]}...")
             
-            return {
+            result = {
                 "success": True,
                 "market_analysis": formatted_analysis,
-                "extracted_text": extracted_text[:500] + "..." if len(extracted_text) > 500 else extracted_text
+                "extracted_text": extracted_text[:500] + "..." if len(extracted_text) > 500 else extracted_text,
+                "timings": timings
             }
+            if missing_facets:
+                # Sized without part of the research; main only keeps this for DEGRADED_RESULT_TTL
+                missing = ", ".join(RESEARCH_FACETS[facet][0] for facet in missing_facets)
+                result["market_analysis"] = f"{formatted_analysis}\n\n⚠️ Not available right now, please retry in a few minutes: {missing}"
+                result["degraded"] = True
+                result["missing_facets"] = missing_facets
+            return result
             
         except Exception as e:
             error_msg = f"Market size analysis failed: {str(e)}"
             logger.error(f"❌ {error_msg}")
             
             # Return clear error without fallback
-            return {
+            result = {
                 "success": False,
                 "error": error_msg,
                 "message": "Web search market analysis is currently unavailable. Please try again later."
             }
+            circuit = find_circuit_open(e)
+            if circuit is not None:
+                result["retry_after"] = circuit.retry_after
+            return result
 
     async def full_market_analysis(self, extracted_text: str) -> dict:
         """
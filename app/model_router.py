@@ -0,0 +1,181 @@
+import json
+import time
+import logging
+from functools import lru_cache
+import openai
+from settings import get_settings
+from circuit_breaker import CircuitOpen, get_breaker
+
+logger = logging.getLogger(__name__)
+
+# "agent.task" -> ordered rules. The first rule whose max_input_tokens is not
+# exceeded (or that has no limit) picks the model; its fallbacks are tried in
+# order when the model is rate limited or overloaded. A rule's slow_call_seconds
+# replaces OPENAI_SLOW_CALL_SECONDS for its calls (0: never counted as slow).
+DEFAULT_ROUTES = {
+    "pdf_extractor.extract_text": [
+        {"model": "gpt-4o", "fallbacks": ["gpt-4.1"]}
+    ],
+    "pitchdeck.analyze": [
+        {"max_input_tokens": 100000, "model": "gpt-4o", "fallbacks": ["gpt-4.1"]},
+        {"model": "gpt-4.1", "fallbacks": []}
+    ],
+    "product.analyze": [
+        {"max_input_tokens": 100000, "model": "gpt-4o", "fallbacks": ["gpt-4.1"]},
+        {"model": "gpt-4.1", "fallbacks": []}
+    ],
+    # Short extraction tasks do not need a flagship model
+    "web_research.company_name": [
+        {"max_input_tokens": 100000, "model": "gpt-4o-mini", "fallbacks": ["gpt-4o"]},
+        {"model": "gpt-4.1-mini", "fallbacks": ["gpt-4.1"]}
+    ],
+    "market_size.market_query": [
+        {"max_input_tokens": 100000, "model": "gpt-4o-mini", "fallbacks": ["gpt-4o"]},
+        {"model": "gpt-4.1-mini", "fallbacks": ["gpt-4.1"]}
+    ],
+    # Web searches routinely take minutes, so only their failures count against the breaker
+    "market_size.web_research": [
+        {"model": "gpt-5", "fallbacks": ["gpt-4o"], "slow_call_seconds": 0}
+    ],
+    "market_size.facet_research": [
+        {"model": "gpt-5", "fallbacks": ["gpt-4o"], "slow_call_seconds": 0}
+    ],
+    "market_size.sizing": [
+        {"model": "gpt-5", "fallbacks": ["gpt-4o"]}
+    ],
+    "market_size.format": [
+        {"model": "gpt-5", "fallbacks": ["gpt-4o"]}
+    ],
+    "report_generator.report": [
+        {"model": "gpt-4o", "fallbacks": ["gpt-4.1"]}
+    ],
+    "report_generator.synthesis": [
+        {"model": "gpt-4o", "fallbacks": ["gpt-4.1"]}
+    ],
+}
+
+# Errors that mean "this model is busy right now", not "this request is wrong"
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APITimeoutError)
+
+# Errors that count against a model's circuit breaker (APIConnectionError includes timeouts)
+BREAKER_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for routing decisions
+    return len(text) // 4
+
+def response_output_length(response) -> int:
+    if hasattr(response, "output_text"):
+        return len(response.output_text or "")
+    try:
+        return len(response.choices[0].message.content or "")
+    except (AttributeError, IndexError):
+        return 0
+
+class ModelRouter:
+    """
+    Picks the model for each agent call from the route table and falls back to
+    the next model when one is rate limited or its circuit breaker is open.
+    Per-route latency and output size are recorded for /metrics and the
+    comparison harness.
+    """
+
+    def __init__(self, routes: dict):
+        self.routes = routes
+        self.stats = {}
+
+    def rule(self, route: str, input_text: str) -> dict:
+        tokens = estimate_tokens(input_text)
+        for rule in self.routes[route]:
+            max_tokens = rule.get("max_input_tokens")
+            if max_tokens is None or tokens <= max_tokens:
+                return rule
+        # Every rule has a limit and the input exceeds them all: use the largest one
+        return self.routes[route][-1]
+
+    def select(self, route: str, input_text: str) -> list:
+        """
+        Returns the models to try for this call, primary model first.
+        """
+        rule = self.rule(route, input_text)
+        return [rule["model"]] + list(rule.get("fallbacks", []))
+
+    def breaker(self, model: str):
+        return get_breaker(f"openai:{model}", BREAKER_ERRORS, get_settings().openai_slow_call_seconds)
+
+    def is_available(self, route: str, input_text: str = "") -> bool:
+        # False when the circuit of every model the route could use is open
+        return any(self.breaker(model).allow_request() for model in self.select(route, input_text))
+
+    async def call(self, route: str, input_text: str, request):
+        """
+        Runs request(model) -> awaitable API response with the routed model,
+        moving on to the fallbacks when a model is rate limited or overloaded.
+        Raises CircuitOpen without calling the API when every model's circuit is open.
+        """
+        models = self.select(route, input_text)
+        slow_call_seconds = self.rule(route, input_text).get("slow_call_seconds")
+        last_error = None
+        for attempt, model in enumerate(models):
+            breaker = self.breaker(model)
+            if not breaker.allow_request():
+                logger.warning(f"⚡ {route}: circuit for {model} is open, skipping it")
+                last_error = CircuitOpen(breaker)
+                continue
+            
+            start = time.perf_counter()
+            try:
+                response = await breaker.call(lambda: request(model), slow_call_seconds)
+            except CircuitOpen as e:
+                # Another request is already probing this model
+                last_error = e
+                continue
+            except RETRYABLE_ERRORS as e:
+                self._record(route, model, time.perf_counter() - start, error=True)
+                last_error = e
+                if attempt + 1 < len(models):
+                    logger.warning(f"⚠️ {route}: {model} unavailable ({type(e).__name__}), falling back to {models[attempt + 1]}")
+                continue
+
+            latency = time.perf_counter() - start
+            self._record(route, model, latency, output_length=response_output_length(response), fallback=attempt > 0)
+            logger.info(f"🧭 {route} -> {model} ({estimate_tokens(input_text)} input tokens, {latency:.1f}s)")
+            return response
+
+        raise last_error
+
+    def _record(self, route: str, model: str, latency: float, output_length: int = 0,
+                error: bool = False, fallback: bool = False):
+        entry = self.stats.setdefault(f"{route}:{model}", {
+            "calls": 0,
+            "errors": 0,
+            "fallback_calls": 0,
+            "total_latency_seconds": 0.0,
+            "total_output_chars": 0
+        })
+        if error:
+            entry["errors"] += 1
+            return
+        entry["calls"] += 1
+        entry["fallback_calls"] += int(fallback)
+        entry["total_latency_seconds"] += latency
+        entry["total_output_chars"] += output_length
+
+    def summary(self) -> dict:
+        return {
+            key: {
+                **entry,
+                "avg_latency_seconds": round(entry["total_latency_seconds"] / entry["calls"], 3) if entry["calls"] else None,
+                "avg_output_chars": round(entry["total_output_chars"] / entry["calls"]) if entry["calls"] else None
+            }
+            for key, entry in self.stats.items()
+        }
+
+@lru_cache(maxsize=1)
+def get_model_router() -> ModelRouter:
+    routes = dict(DEFAULT_ROUTES)
+    overrides = get_settings().model_routes
+    if overrides:
+        # e.g. MODEL_ROUTES='{"pitchdeck.analyze": [{"model": "gpt-4.1", "fallbacks": ["gpt-4o"]}]}'
+        routes.update(json.loads(overrides))
+    return ModelRouter(routes)
@@ -0,0 +1,250 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ContentStream, DictionaryObject, NameObject, NumberObject
+from settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Page entries that only matter to authoring tools, never to text extraction
+PAGE_METADATA_KEYS = ("/Metadata", "/PieceInfo", "/Thumb")
+
+_process_pool = None
+
+# Cumulative results of this worker process, reported on /metrics
+optimization_totals = {
+    "files": 0,
+    "original_bytes": 0,
+    "optimized_bytes": 0,
+    "seconds": 0.0
+}
+
+def _filters(stream) -> list:
+    filters = stream.get("/Filter")
+    if filters is None:
+        return []
+    if isinstance(filters, list):
+        return [str(f) for f in filters]
+    return [str(filters)]
+
+def recompress_image(image_stream, max_dimension: int, jpeg_quality: int) -> bool:
+    """
+    Downsamples and re-encodes an image XObject as JPEG in place. Returns True
+    if the image was replaced. Images with masks, decode arrays or unusual
+    color spaces are left untouched.
+    """
+    if any(key in image_stream for key in ("/SMask", "/Mask", "/ImageMask", "/Decode")):
+        return False
+
+    width = int(image_stream["/Width"])
+    height = int(image_stream["/Height"])
+    color_space = image_stream.get("/ColorSpace")
+    original_data = image_stream._data
+    filters = _filters(image_stream)
+
+    try:
+        if filters == ["/DCTDecode"]:
+            image = Image.open(io.BytesIO(original_data))
+            image.load()
+        elif filters in ([], ["/FlateDecode"]) and image_stream.get("/BitsPerComponent") == 8 \
+                and color_space in ("/DeviceRGB", "/DeviceGray"):
+            mode = "RGB" if color_space == "/DeviceRGB" else "L"
+            raw = image_stream.get_data()
+            if len(raw) != width * height * len(mode):
+                return False
+            image = Image.frombytes(mode, (width, height), raw)
+        else:
+            return False
+    except Exception as e:
+        logger.debug(f"Skipping undecodable image: {str(e)}")
+        return False
+
+    # CMYK/palette JPEGs need colour handling the extraction model does not benefit from
+    if image.mode not in ("RGB", "L"):
+        return False
+
+    if max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=jpeg_quality, optimize=True)
+    new_data = buffer.getvalue()
+    if len(new_data) >= len(original_data):
+        return False
+
+    image_stream._data = new_data
+    image_stream.decoded_self = None
+    image_stream[NameObject("/Filter")] = NameObject("/DCTDecode")
+    image_stream[NameObject("/Width")] = NumberObject(image.size[0])
+    image_stream[NameObject("/Height")] = NumberObject(image.size[1])
+    image_stream[NameObject("/ColorSpace")] = NameObject("/DeviceRGB" if image.mode == "RGB" else "/DeviceGray")
+    image_stream[NameObject("/BitsPerComponent")] = NumberObject(8)
+    if "/DecodeParms" in image_stream:
+        del image_stream["/DecodeParms"]
+    return True
+
+def used_font_names(page, reader) -> set:
+    contents = page.get_contents()
+    if contents is None:
+        return set()
+    operations = ContentStream(contents, reader).operations
+    return {str(operands[0]) for operands, operator in operations if operator == b"Tf" and operands}
+
+def prune_unused_fonts(page, reader) -> int:
+    resources = page.get("/Resources")
+    if resources is None:
+        return 0
+    resources = resources.get_object()
+    fonts = resources.get("/Font")
+    if fonts is None:
+        return 0
+    fonts = fonts.get_object()
+
+    # Legacy form XObjects without their own resources use the page's fonts
+    for xobject in resources.get("/XObject", DictionaryObject()).get_object().values():
+        xobject = xobject.get_object()
+        if xobject.get("/Subtype") == "/Form" and "/Resources" not in xobject:
+            return 0
+
+    used = used_font_names(page, reader)
+    kept = DictionaryObject({name: ref for name, ref in fonts.items() if name in used})
+    removed = len(fonts) - len(kept)
+    if removed:
+        # Resource dictionaries may be shared between pages, so give this page its own copy
+        page_resources = DictionaryObject(resources)
+        page_resources[NameObject("/Font")] = kept
+        page[NameObject("/Resources")] = page_resources
+    return removed
+
+def optimize_pdf(input_path: str, output_path: str, max_image_dimension: int, jpeg_quality: int) -> dict:
+    """
+    Writes a slimmed copy of input_path to output_path. Runs in a worker process.
+    """
+    start = time.perf_counter()
+    reader = PdfReader(input_path)
+    writer = PdfWriter()
+
+    processed_images = set()
+    canonical_images = {}
+    stats = {"images_recompressed": 0, "images_deduplicated": 0, "fonts_removed": 0}
+
+    for page in reader.pages:
+        for key in PAGE_METADATA_KEYS:
+            if key in page:
+                del page[key]
+
+        resources = page.get("/Resources")
+        xobjects = resources.get_object().get("/XObject") if resources is not None else None
+        if xobjects is not None:
+            xobjects = xobjects.get_object()
+            for name, reference in list(xobjects.items()):
+                image_stream = reference.get_object()
+                if image_stream.get("/Subtype") != "/Image":
+                    continue
+
+                # Point identical images (same bytes and parameters) at a single object
+                digest = hashlib.sha256(
+                    image_stream._data + repr(sorted((str(k), str(v)) for k, v in image_stream.items())).encode()
+                ).hexdigest()
+                object_id = getattr(reference, "idnum", id(image_stream))
+                canonical_id, canonical = canonical_images.setdefault(digest, (object_id, reference))
+                if canonical_id != object_id:
+                    xobjects[NameObject(name)] = canonical
+                    stats["images_deduplicated"] += 1
+                    continue
+
+                if object_id not in processed_images:
+                    processed_images.add(object_id)
+                    for key in PAGE_METADATA_KEYS:
+                        if key in image_stream:
+                            del image_stream[key]
+                    if recompress_image(image_stream, max_image_dimension, jpeg_quality):
+                        stats["images_recompressed"] += 1
+
+        stats["fonts_removed"] += prune_unused_fonts(page, reader)
+        writer.add_page(page)
+
+    for page in writer.pages:
+        page.compress_content_streams()
+
+    # Only pages are copied, so document-level metadata, outlines and attachments are dropped
+    with open(output_path, "wb") as output_pdf:
+        writer.write(output_pdf)
+
+    stats["original_bytes"] = os.path.getsize(input_path)
+    stats["optimized_bytes"] = os.path.getsize(output_path)
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # Forking a server worker would copy its event loop, locks and threads mid-use;
+        # forkserver children start from a clean single-threaded process instead
+        _process_pool = ProcessPoolExecutor(
+            max_workers=get_settings().pdf_optimize_workers,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _process_pool
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+async def slim_pdf(pdf_path: str) -> tuple:
+    """
+    Returns (path to upload, stats). The path is a new temporary file the caller
+    must delete, or pdf_path itself when slimming is disabled or did not help.
+    """
+    settings = get_settings()
+    original_bytes = os.path.getsize(pdf_path)
+    if not settings.pdf_optimize or original_bytes < settings.pdf_optimize_min_bytes:
+        return pdf_path, None
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+        output_path = temp_file.name
+
+    start = time.perf_counter()
+    try:
+        stats = await asyncio.get_running_loop().run_in_executor(
+            get_process_pool(),
+            optimize_pdf,
+            pdf_path,
+            output_path,
+            settings.pdf_optimize_max_image_dimension,
+            settings.pdf_optimize_jpeg_quality
+        )
+    except Exception as e:
+        os.unlink(output_path)
+        logger.warning(f"⚠️ PDF optimization failed, uploading original: {str(e)}")
+        return pdf_path, None
+
+    stats["latency_seconds"] = round(time.perf_counter() - start, 3)
+    saved = 100 * (1 - stats["optimized_bytes"] / stats["original_bytes"])
+    logger.info(
+        f"📉 PDF slimmed {stats['original_bytes']} -> {stats['optimized_bytes']} bytes ({saved:.1f}% smaller) "
+        f"in {stats['latency_seconds']}s: {stats['images_recompressed']} images recompressed, "
+        f"{stats['images_deduplicated']} deduplicated, {stats['fonts_removed']} unused fonts removed"
+    )
+
+    optimization_totals["files"] += 1
+    optimization_totals["original_bytes"] += stats["original_bytes"]
+    optimization_totals["seconds"] += stats["latency_seconds"]
+
+    if stats["optimized_bytes"] >= stats["original_bytes"]:
+        os.unlink(output_path)
+        optimization_totals["optimized_bytes"] += stats["original_bytes"]
+        return pdf_path, stats
+
+    optimization_totals["optimized_bytes"] += stats["optimized_bytes"]
+    return output_path, stats
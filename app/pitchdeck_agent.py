@@ -1,16 +1,14 @@
 import openai
-import os
 import logging
-from dotenv import load_dotenv
+from settings import get_settings
+from model_router import get_model_router
 
-load_dotenv()
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class PitchDeckAgent:
     def __init__(self):
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = openai.AsyncOpenAI(api_key=get_settings().openai_api_key)
+        self.model_router = get_model_router()
         self.analysis_prompt = """You are a Venture Capital analyst.
 Your task is to analyze the provided pitch deck and produce a structured Executive Summary that is concise, investment-oriented, and ready to be displayed on a front end.
 
@@ -91,25 +89,29 @@ Do not add commentary, conclusions, or recommendations.
             logger.info("🔍 Starting pitch deck analysis...")
             logger.info(f"📄 Text length: {len(extracted_text)} characters")
             
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.analysis_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Analise o seguinte pitch deck:\n\n{extracted_text}"
-                    }
-                ],
-                temperature=0.1
+            response = await self.model_router.call(
+                "pitchdeck.analyze",
+                extracted_text,
+                lambda model: self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": self.analysis_prompt
+                        },
+                        {
+                            "role": "user",
+                            "content": f"Analise o seguinte pitch deck:\n\n{extracted_text}"
+                        }
+                    ],
+                    temperature=0.1
+                )
             )
             
             analysis = response.choices[0].message.content
             
             logger.info(f"✅ Analysis completed. Response length: {len(analysis)} characters")
-            logger.info(f"📄 Analysis preview: {analysis[:200]}...")
+            logger.debug(f"📄 Analysis preview: {analysis[:200]}...")
             
             return analysis
             
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from logging_config import request_id_var
+
+logger = logging.getLogger(__name__)
+
+# Paths that are never worth profiling
+EXCLUDED_PREFIXES = ("/healthz", "/readyz", "/metrics", "/admin", "/static")
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler: a background thread records the stack of every
+    other thread at a fixed interval. Unlike cProfile it sees work running in
+    asyncio.to_thread / executor threads, and time the event loop spends idle
+    in select() shows up as waiting on the network.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        # Created on the event loop thread, which is always sampled; other threads
+        # only while they run app code, so idle pool workers and the log
+        # listener do not drown out the request
+        self.loop_thread_id = threading.get_ident()
+        self.app_dir = os.path.dirname(os.path.abspath(__file__))
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                runs_app_code = thread_id == self.loop_thread_id
+                while frame is not None:
+                    code = frame.f_code
+                    runs_app_code = runs_app_code or code.co_filename.startswith(self.app_dir)
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if not runs_app_code:
+                    continue
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def folded(self) -> str:
+        # "Folded" stacks, readable by speedscope and flamegraph.pl
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def top_functions(self, limit: int = 25) -> dict:
+        self_counts = Counter()
+        inclusive_counts = Counter()
+        for stack, count in self.samples.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            self_counts[frames[-1]] += count
+            for function in set(frames):
+                inclusive_counts[function] += count
+        to_seconds = lambda counts: [
+            {"function": function, "seconds": round(count * self.interval, 3)}
+            for function, count in counts.most_common(limit)
+        ]
+        return {"self": to_seconds(self_counts), "inclusive": to_seconds(inclusive_counts)}
+
+class ProfileStore:
+    """
+    Keeps the most recent profiles on disk, deleting the oldest beyond the retention limit.
+    """
+
+    def __init__(self, directory: str, retention: int):
+        self.directory = directory
+        # The profile just saved is always kept; a slice of [:-0] would keep everything
+        self.retention = max(retention, 1)
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, metadata: dict, folded: str):
+        with open(os.path.join(self.directory, f"{metadata['id']}.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+        with open(os.path.join(self.directory, f"{metadata['id']}.folded"), "w") as f:
+            f.write(folded)
+
+        profile_ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+        for profile_id in profile_ids[:-self.retention]:
+            for extension in (".json", ".folded"):
+                try:
+                    os.unlink(os.path.join(self.directory, profile_id + extension))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> list:
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith(".json"):
+                with open(os.path.join(self.directory, name), "r") as f:
+                    metadata = json.load(f)
+                metadata.pop("top_functions", None)
+                profiles.append(metadata)
+        return profiles
+
+    def path(self, profile_id: str, extension: str) -> str:
+        # Profile IDs are generated by us; anything else must not escape the directory
+        if os.path.basename(profile_id) != profile_id:
+            return None
+        path = os.path.join(self.directory, profile_id + extension)
+        return path if os.path.exists(path) else None
+
+    def read(self, profile_id: str, extension: str) -> str:
+        path = self.path(profile_id, extension)
+        if path is None:
+            return None
+        try:
+            with open(path, "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            # Deleted by retention since path() looked
+            return None
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling a request when it carries X-Profile: 1 together
+    with the admin token, or when it is picked by the configured sample rate.
+    Only one request per worker is profiled at a time.
+    """
+
+    def __init__(self, app, store: ProfileStore, admin_token: str, sample_rate: float, interval: float):
+        self.app = app
+        self.store = store
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self._active = False
+
+    def should_profile(self, scope) -> bool:
+        if scope["type"] != "http" or self._active or scope["path"].startswith(EXCLUDED_PREFIXES):
+            return False
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-profile") == b"1" and self.admin_token \
+                and headers.get(b"x-admin-token", b"").decode() == self.admin_token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        status = {"code": None}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        sampler = StackSampler(self.interval)
+        started_at = datetime.now(timezone.utc)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            sampler.stop()
+            self._active = False
+            metadata = {
+                # File names never contain client-controlled values such as the request ID
+                "id": f"{started_at.strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}",
+                "request_id": request_id_var.get(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status["code"],
+                "started_at": started_at.isoformat(),
+                "wall_seconds": round(time.perf_counter() - wall_start, 3),
+                # Process-wide CPU time, so it includes any concurrent requests
+                "cpu_seconds": round(time.process_time() - cpu_start, 3),
+                "samples": sampler.sample_count,
+                "sample_interval_seconds": self.interval,
+                "top_functions": sampler.top_functions()
+            }
+            try:
+                await asyncio.to_thread(self.store.save, metadata, sampler.folded())
+                logger.info(f"🔬 Saved profile {metadata['id']} ({metadata['wall_seconds']}s wall, {metadata['cpu_seconds']}s CPU)")
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to save profile: {str(e)}")
@@ -1,16 +1,30 @@
 import openai
-import os
+import hashlib
 import logging
-from dotenv import load_dotenv
+from datetime import date
+from settings import get_settings
+from model_router import get_model_router
 
-load_dotenv()
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Report input -> (section heading, label in the model input, what the placeholder waits for), in report order
+REPORT_SECTIONS = {
+    "pitchdeck_analysis": ("🎪 Pitch Deck Analysis", "PITCH DECK ANALYSIS", "the pitch deck analysis"),
+    "product_analysis": ("🚀 Product Overview", "PRODUCT ANALYSIS", "the product analysis"),
+    "web_research": ("🌐 Market Research & Intelligence", "WEB RESEARCH ANALYSIS", "the web research"),
+    "market_analysis": ("📈 Market Size & Opportunity", "MARKET SIZE ANALYSIS", "the market size analysis"),
+}
+
+SUMMARY_HEADING = "## 🎯 Executive Summary"
+INSIGHTS_HEADING = "## 💡 Strategic Insights & Recommendations"
+
+def section_hashes(sections: dict) -> dict:
+    return {key: hashlib.sha256(text.encode("utf-8")).hexdigest()[:16] for key, text in sections.items()}
+
 class ReportGeneratorAgent:
     def __init__(self):
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = openai.AsyncOpenAI(api_key=get_settings().openai_api_key)
+        self.model_router = get_model_router()
         
         self.report_generation_prompt = """# COMPREHENSIVE BUSINESS REPORT GENERATOR
 
@@ -88,6 +102,40 @@ Use this EXACT structure with markdown formatting:
 - Bold important numbers and key points
 - Keep the executive summary concise but comprehensive"""
 
+        self.synthesis_prompt = f"""# REPORT SYNTHESIS WRITER
+
+## ROLE
+You are an executive-level business analyst writing the synthesis parts of a business report whose analysis sections are shown to the reader verbatim.
+
+## TASK
+Write the executive summary and the strategic insights from the analyses provided. Some analyses may still be missing: base every statement only on what is provided and do not speculate about the missing ones.
+
+## OUTPUT FORMAT REQUIREMENTS
+
+Output exactly these two sections in markdown and nothing else:
+
+{SUMMARY_HEADING}
+[Write a concise 2-3 paragraph executive summary that synthesizes the key findings. Focus on investment potential, key metrics, and strategic insights.]
+
+{INSIGHTS_HEADING}
+
+### Key Strengths
+- [Synthesize 3-4 key strengths]
+
+### Market Opportunities
+- [Synthesize 3-4 key market opportunities]
+
+### Investment Considerations
+- [Synthesize 3-4 key investment considerations]
+
+### Risk Factors
+- [Identify 2-3 potential risk factors]
+
+## FORMATTING INSTRUCTIONS
+- Maintain professional tone throughout
+- Bold important numbers and key points
+- When asked to update an existing synthesis, keep what still holds and revise it with the new analysis"""
+
     async def generate_complete_report(self, pitchdeck_analysis: str, product_analysis: str, 
                                      web_research: str, market_analysis: str, company_name: str = None) -> str:
         """
@@ -127,30 +175,152 @@ MARKET SIZE ANALYSIS:
 
 Please follow the exact format specified in your system prompt to create a professional, executive-ready report."""
 
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.report_generation_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": complete_input
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=4000  # Ensure we have enough tokens for a comprehensive report
+            response = await self.model_router.call(
+                "report_generator.report",
+                complete_input,
+                lambda model: self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": self.report_generation_prompt
+                        },
+                        {
+                            "role": "user",
+                            "content": complete_input
+                        }
+                    ],
+                    temperature=0.1,
+                    max_tokens=4000  # Ensure we have enough tokens for a comprehensive report
+                )
             )
             
             comprehensive_report = response.choices[0].message.content
             
             logger.info(f"✅ Comprehensive report generated successfully")
             logger.info(f"📊 Report length: {len(comprehensive_report)} characters")
-            logger.info(f"📄 Report preview: {comprehensive_report[:300]}...")
+            logger.debug(f"📄 Report preview: {comprehensive_report[:300]}...")
             
             return comprehensive_report
             
         except Exception as e:
             logger.error(f"❌ Report generation error: {str(e)}")
-            raise Exception(f"Failed to generate comprehensive report: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to generate comprehensive report: {str(e)}")
+
+    def synthesis_outdated(self, synthesis: dict, sections: dict) -> bool:
+        """
+        True when a section was added or changed since the synthesis was written.
+        """
+        if synthesis is None:
+            return True
+        inputs = synthesis["inputs"]
+        return any(inputs.get(key) != digest for key, digest in section_hashes(sections).items())
+
+    async def update_synthesis(self, sections: dict, company_name: str = None, previous: dict = None) -> dict:
+        """
+        Writes the executive summary and strategic insights for the available sections.
+        
+        When exactly one section is new or changed since the previous synthesis, only
+        that section is sent along with the previous synthesis to revise; otherwise
+        the synthesis is written from all sections.
+        
+        Returns:
+            {"inputs": section hashes, "executive_summary", "strategic_insights"}
+        """
+        try:
+            hashes = section_hashes(sections)
+            changed = [key for key in sections if previous is None or previous["inputs"].get(key) != hashes[key]]
+            
+            if previous is not None and len(changed) == 1:
+                key = changed[0]
+                logger.info(f"🧠 Updating report synthesis with {key}")
+                synthesis_input = f"""Update this synthesis with a new analysis:
+
+COMPANY NAME: {company_name if company_name else "Not specified"}
+
+CURRENT SYNTHESIS:
+{SUMMARY_HEADING}
+{previous["executive_summary"]}
+
+{INSIGHTS_HEADING}
+{previous["strategic_insights"]}
+
+NEW {REPORT_SECTIONS[key][1]}:
+{sections[key]}"""
+            else:
+                logger.info(f"🧠 Writing report synthesis from {len(sections)} sections")
+                analyses = "\n\n".join(
+                    f"{REPORT_SECTIONS[key][1]}:\n{text}" for key, text in sections.items()
+                )
+                synthesis_input = f"""Write the synthesis for the following analyses:
+
+COMPANY NAME: {company_name if company_name else "Not specified"}
+
+{analyses}"""
+            
+            response = await self.model_router.call(
+                "report_generator.synthesis",
+                synthesis_input,
+                lambda model: self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": self.synthesis_prompt
+                        },
+                        {
+                            "role": "user",
+                            "content": synthesis_input
+                        }
+                    ],
+                    temperature=0.1,
+                    max_tokens=1500
+                )
+            )
+            
+            content = response.choices[0].message.content
+            summary, _, insights = content.partition(INSIGHTS_HEADING)
+            
+            logger.info(f"✅ Report synthesis updated ({len(content)} characters)")
+            
+            return {
+                "inputs": {**(previous["inputs"] if previous and len(changed) == 1 else {}), **hashes},
+                "executive_summary": summary.replace(SUMMARY_HEADING, "").strip(),
+                "strategic_insights": insights.strip()
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ Report synthesis error: {str(e)}")
+            raise Exception(f"Failed to update report synthesis: {str(e)}")
+
+    def assemble_report(self, sections: dict, synthesis: dict = None, company_name: str = None,
+                        errors: dict = None) -> str:
+        """
+        Builds the report in the layout of report_generation_prompt from the sections
+        available so far, with placeholders for the ones still running.
+        """
+        errors = errors or {}
+        waiting = "_⏳ Will be written as soon as the first analysis completes._"
+        parts = [
+            "# 📊 Comprehensive Business Analysis Report",
+            f"{SUMMARY_HEADING}\n{synthesis['executive_summary'] if synthesis else waiting}"
+        ]
+        
+        for key, (heading, _, description) in REPORT_SECTIONS.items():
+            if key in sections:
+                body = sections[key]
+            elif key in errors:
+                body = f"_⚠️ {errors[key]}_"
+            else:
+                body = f"_⏳ Waiting for {description}..._"
+            parts.append(f"## {heading}\n{body}")
+        
+        parts.append(f"{INSIGHTS_HEADING}\n{synthesis['strategic_insights'] if synthesis else waiting}")
+        parts.append(
+            "## 📋 Report Summary\n\n"
+            f"**Company:** {company_name if company_name else 'Not specified'}\n"
+            f"**Analysis Date:** {date.today().isoformat()}\n"
+            f"**Report Sections:** {len(sections)} of {len(REPORT_SECTIONS)} analyses + strategic synthesis"
+        )
+        parts.append("*This report was generated using AI-powered analysis of pitch deck materials and real-time market research.*")
+        return "\n\n---\n\n".join(parts)
@@ -0,0 +1,112 @@
+import asyncio
+import re
+import time
+import unicodedata
+import logging
+from state_store import get_state_store
+
+logger = logging.getLogger(__name__)
+
+# Legal-form suffixes that do not distinguish one company from another
+COMPANY_SUFFIXES = {
+    "inc", "incorporated", "ltd", "limited", "llc", "llp", "corp", "corporation",
+    "co", "company", "sa", "ltda", "gmbh", "ag", "plc", "bv", "srl", "me", "eireli"
+}
+
+# Filler words that do not change what a market query is about
+QUERY_STOPWORDS = {"the", "a", "an", "and", "of", "for", "in", "on", "to", "with", "market", "markets"}
+
+def _tokens(text: str) -> list:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).split()
+
+def normalize_company_name(company_name: str) -> str:
+    tokens = _tokens(company_name)
+    while len(tokens) > 1 and tokens[-1] in COMPANY_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+def normalize_market_query(query: str) -> str:
+    # Word order and filler words are irrelevant: "Fintech payments Brazil" and
+    # "payments market in Brazil (fintech)" should share one cache entry
+    return " ".join(sorted({token for token in _tokens(query) if token not in QUERY_STOPWORDS}))
+
+class ResearchCache:
+    """
+    TTL cache for web-search-backed results, shared by all workers through the
+    state store. Entries younger than fresh_seconds are served as-is; entries
+    within the following stale_seconds are served immediately while a single
+    background task refreshes them.
+    """
+
+    def __init__(self, namespace: str, fresh_seconds: float, stale_seconds: float):
+        self.namespace = namespace
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self.state_store = get_state_store()
+        self._refresh_tasks = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.fresh_seconds > 0
+
+    async def get_or_compute(self, key: str, compute, cacheable=None):
+        """
+        Returns the cached value for key, calling the async compute() on a miss.
+        A computed value is only stored when cacheable(value) is true (if given),
+        so a partial result is returned once without replacing a good entry.
+        """
+        if not self.enabled:
+            return await compute()
+
+        entry = self.state_store.get(self.namespace, key)
+        if entry is not None:
+            age = time.time() - entry["fetched_at"]
+            if age < self.fresh_seconds:
+                logger.info(f"♻️ {self.namespace} cache hit for '{key}' (age {age:.0f}s)")
+                return entry["value"]
+            if age < self.fresh_seconds + self.stale_seconds:
+                logger.info(f"♻️ {self.namespace} serving stale '{key}' (age {age:.0f}s), revalidating")
+                self._schedule_refresh(key, compute, cacheable)
+                return entry["value"]
+
+        logger.info(f"🔍 {self.namespace} cache miss for '{key}'")
+        value = await compute()
+        if cacheable is None or cacheable(value):
+            self._store(key, value)
+        else:
+            logger.info(f"⚠️ {self.namespace} not caching partial result for '{key}'")
+        return value
+
+    def _store(self, key: str, value):
+        self.state_store.set(
+            self.namespace,
+            key,
+            {"value": value, "fetched_at": time.time()},
+            ttl=self.fresh_seconds + self.stale_seconds
+        )
+
+    def _schedule_refresh(self, key: str, compute, cacheable=None):
+        # The lease makes sure only one worker process refreshes a given entry
+        lease_ttl = max(60.0, min(self.fresh_seconds, 15 * 60.0))
+        if not self.state_store.set_if_absent(f"{self.namespace}_refresh", key, True, ttl=lease_ttl):
+            return
+
+        async def refresh():
+            try:
+                value = await compute()
+                if cacheable is not None and not cacheable(value):
+                    # Keep serving the previous complete entry until a full refresh succeeds
+                    logger.warning(f"⚠️ {self.namespace} refresh for '{key}' was partial, keeping the cached entry")
+                    return
+                self._store(key, value)
+                logger.info(f"✅ {self.namespace} refreshed '{key}'")
+            except Exception as e:
+                logger.warning(f"⚠️ {self.namespace} refresh failed for '{key}': {str(e)}")
+            finally:
+                self.state_store.delete(f"{self.namespace}_refresh", key)
+
+        task = asyncio.create_task(refresh())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
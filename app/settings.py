@@ -0,0 +1,123 @@
+import os
+import tempfile
+from functools import lru_cache
+from dotenv import load_dotenv
+from logging_config import configure_logging, parse_module_levels
+
+class Settings:
+    """
+    Application configuration, read from the environment (and .env) once per process.
+    """
+
+    def __init__(self):
+        load_dotenv()
+        
+        self.openai_api_key = os.getenv("OPENAI_API_KEY")
+        self.perplexity_api_key = os.getenv("PERPLEXITY_API_KEY")
+        self.log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+        # e.g. LOG_LEVELS="direct_pdf_extractor=DEBUG,httpx=WARNING"
+        self.log_levels = parse_module_levels(os.getenv("LOG_LEVELS", ""))
+        self.log_max_message_chars = int(os.getenv("LOG_MAX_MESSAGE_CHARS", 500))
+        
+        # JSON overrides for model_router.DEFAULT_ROUTES
+        self.model_routes = os.getenv("MODEL_ROUTES", "")
+        
+        # PDF extraction
+        self.extraction_concurrency = int(os.getenv("EXTRACTION_CONCURRENCY", 4))
+        # Optional slimming of large PDFs before they are uploaded to the Files API
+        self.pdf_optimize = os.getenv("PDF_OPTIMIZE", "0") == "1"
+        self.pdf_optimize_min_bytes = int(os.getenv("PDF_OPTIMIZE_MIN_BYTES", 2 * 1024 * 1024))
+        self.pdf_optimize_max_image_dimension = int(os.getenv("PDF_OPTIMIZE_MAX_IMAGE_DIMENSION", 1600))
+        self.pdf_optimize_jpeg_quality = int(os.getenv("PDF_OPTIMIZE_JPEG_QUALITY", 70))
+        self.pdf_optimize_workers = int(os.getenv("PDF_OPTIMIZE_WORKERS", 2))
+        # Strip repeated footers, page numbers and chunk scaffolding before agents see the text
+        self.text_compaction = os.getenv("TEXT_COMPACTION", "1") == "1"
+        
+        # Shared state
+        self.state_db_path = os.getenv("STATE_DB_PATH")
+        # Store calls run on the event loop, so a locked database must not stall a worker for long
+        self.state_db_busy_timeout = float(os.getenv("STATE_DB_BUSY_TIMEOUT", 2))
+        self.analysis_cache_ttl = int(os.getenv("ANALYSIS_CACHE_TTL", 24 * 60 * 60))
+        self.document_ttl = int(os.getenv("DOCUMENT_TTL", 24 * 60 * 60))
+        
+        # Web-search result caches (seconds; a TTL of 0 disables the cache)
+        self.web_research_cache_ttl = float(os.getenv("WEB_RESEARCH_CACHE_TTL", 6 * 60 * 60))
+        self.web_research_cache_stale = float(os.getenv("WEB_RESEARCH_CACHE_STALE", 24 * 60 * 60))
+        self.market_research_cache_ttl = float(os.getenv("MARKET_RESEARCH_CACHE_TTL", 7 * 24 * 60 * 60))
+        self.market_research_cache_stale = float(os.getenv("MARKET_RESEARCH_CACHE_STALE", 7 * 24 * 60 * 60))
+        # Perplexity queries fanned out per company (see web_research_agent.RESEARCH_TOPICS)
+        self.web_research_topics = parse_web_research_topics(os.getenv("WEB_RESEARCH_TOPICS", ""))
+        # "parallel" runs narrower TAM / SAM / competitor web searches concurrently,
+        # "single" one web search covering everything. Parallel stays opt-in until it
+        # has been benchmarked against the real API (benchmarks/market_size_latency.py)
+        self.market_research_mode = os.getenv("MARKET_RESEARCH_MODE", "single")
+        
+        # Circuit breakers for OpenAI models and Perplexity (per worker process)
+        self.circuit_breakers = os.getenv("CIRCUIT_BREAKERS", "1") == "1"
+        self.circuit_failure_rate = float(os.getenv("CIRCUIT_FAILURE_RATE", 0.5))
+        self.circuit_min_calls = int(os.getenv("CIRCUIT_MIN_CALLS", 5))
+        self.circuit_window = int(os.getenv("CIRCUIT_WINDOW", 20))
+        self.circuit_open_seconds = float(os.getenv("CIRCUIT_OPEN_SECONDS", 30))
+        self.openai_slow_call_seconds = float(os.getenv("OPENAI_SLOW_CALL_SECONDS", 180))
+        self.perplexity_slow_call_seconds = float(os.getenv("PERPLEXITY_SLOW_CALL_SECONDS", 60))
+        # Results produced in a degraded mode (e.g. without web research) are cached briefly
+        self.degraded_result_ttl = int(os.getenv("DEGRADED_RESULT_TTL", 5 * 60))
+        
+        # Admission control for heavy endpoints
+        self.admission_limits = parse_admission_limits(os.getenv("ADMISSION_LIMITS", ""))
+        
+        # Admin endpoints are disabled unless a token is configured
+        self.admin_token = os.getenv("ADMIN_TOKEN")
+        
+        # On-demand profiling (X-Profile: 1 with the admin token, or sampled)
+        self.profile_sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+        self.profile_interval_seconds = float(os.getenv("PROFILE_INTERVAL_SECONDS", 0.005))
+        self.profile_dir = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "buy_side_workflow_profiles"))
+        self.profile_retention = int(os.getenv("PROFILE_RETENTION", 50))
+        
+        # Readiness probe
+        self.readiness_check_upstream = os.getenv("READINESS_CHECK_UPSTREAM", "1") == "1"
+        self.readiness_cache_seconds = float(os.getenv("READINESS_CACHE_SECONDS", 30))
+        self.readiness_timeout_seconds = float(os.getenv("READINESS_TIMEOUT_SECONDS", 3))
+
+# Request path -> (max concurrent, max queued, queue timeout seconds)
+DEFAULT_ADMISSION_LIMITS = {
+    "/upload": (4, 8, 30.0),
+    "/analyze": (16, 32, 60.0),
+    "/analyze_product": (16, 32, 60.0),
+    "/research_company": (8, 16, 60.0),
+    "/analyze_market_size": (4, 8, 60.0),
+    "/generate_report": (8, 16, 60.0),
+}
+
+def parse_admission_limits(spec: str) -> dict:
+    """
+    Parses "/upload=2:4:30,/analyze=8:16:60" on top of DEFAULT_ADMISSION_LIMITS.
+    """
+    limits = dict(DEFAULT_ADMISSION_LIMITS)
+    for item in spec.split(","):
+        path, _, values = item.strip().partition("=")
+        if not path or not values:
+            continue
+        max_concurrent, max_queue, queue_timeout = values.split(":")
+        limits[path.strip()] = (int(max_concurrent), int(max_queue), float(queue_timeout))
+    return limits
+
+# Every topic web_research_agent.RESEARCH_TOPICS knows how to query
+WEB_RESEARCH_TOPICS = ("news", "funding", "competitors", "leadership")
+
+def parse_web_research_topics(spec: str) -> list:
+    """
+    Parses "news,funding"; an empty spec means every topic. Unknown topics fail at startup.
+    """
+    topics = list(dict.fromkeys(topic.strip() for topic in spec.split(",") if topic.strip()))
+    unknown = [topic for topic in topics if topic not in WEB_RESEARCH_TOPICS]
+    if unknown:
+        raise ValueError(f"Unknown WEB_RESEARCH_TOPICS: {', '.join(unknown)} (expected any of {', '.join(WEB_RESEARCH_TOPICS)})")
+    return topics or list(WEB_RESEARCH_TOPICS)
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    settings = Settings()
+    configure_logging(settings.log_level, settings.log_levels, settings.log_max_message_chars)
+    return settings
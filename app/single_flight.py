@@ -0,0 +1,41 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time in this worker process;
+    callers arriving while it runs wait for the same result. The computation is
+    cancelled once every caller waiting for it has gone away.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: str, compute):
+        """
+        Returns the result of the async compute(), shared with concurrent callers for key.
+        """
+        call = self._calls.get(key)
+        if call is None or call["task"].cancelled():
+            call = self._calls[key] = {"task": asyncio.ensure_future(compute()), "waiters": 0}
+            call["task"].add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+        else:
+            logger.info(f"🔗 Joining in-flight computation for '{key}'")
+
+        call["waiters"] += 1
+        try:
+            # Shielded so one cancelled caller does not cancel the others' result
+            return await asyncio.shield(call["task"])
+        finally:
+            call["waiters"] -= 1
+            if call["waiters"] == 0 and not call["task"].done():
+                call["task"].cancel()
+
+    def _forget(self, key: str, call: dict):
+        if self._calls.get(key) is call:
+            del self._calls[key]
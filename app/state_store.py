@@ -0,0 +1,123 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import logging
+from functools import lru_cache
+from settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+class SharedStateStore:
+    """
+    Small key/value store backed by SQLite so that every uvicorn worker
+    process sees the same caches and job state.
+    """
+
+    def __init__(self, db_path: str = None, busy_timeout: float = 2.0):
+        self.db_path = db_path or os.path.join(
+            tempfile.gettempdir(), "buy_side_workflow_state.sqlite3"
+        )
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._create_schema()
+        logger.info(f"🗄️ Shared state store ready at {self.db_path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections are per thread and per process: a connection inherited
+        # across fork must never be reused by the child.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _create_schema(self):
+        self._connection().execute(
+            """CREATE TABLE IF NOT EXISTS state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+
+    def get(self, namespace: str, key: str, default=None):
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM state WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(namespace, key)
+            return default
+        return json.loads(value)
+
+    def set(self, namespace: str, key: str, value, ttl: float = None):
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        self._connection().execute(
+            """INSERT INTO state (namespace, key, value, updated_at, expires_at)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (namespace, key) DO UPDATE SET
+                   value = excluded.value,
+                   updated_at = excluded.updated_at,
+                   expires_at = excluded.expires_at""",
+            (namespace, key, json.dumps(value), now, expires_at)
+        )
+
+    def set_if_absent(self, namespace: str, key: str, value, ttl: float = None) -> bool:
+        """
+        Atomically stores value unless a live entry exists; returns True if it was stored.
+        Used as a cross-worker lease.
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM state WHERE namespace = ? AND key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (namespace, key, now)
+            )
+            cursor = conn.execute(
+                """INSERT OR IGNORE INTO state (namespace, key, value, updated_at, expires_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (namespace, key, json.dumps(value), now, now + ttl if ttl else None)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def delete(self, namespace: str, key: str):
+        self._connection().execute(
+            "DELETE FROM state WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        )
+
+    def purge_expired(self) -> int:
+        cursor = self._connection().execute(
+            "DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (time.time(),)
+        )
+        return cursor.rowcount
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+@lru_cache(maxsize=1)
+def get_state_store() -> SharedStateStore:
+    return SharedStateStore(get_settings().state_db_path, get_settings().state_db_busy_timeout)
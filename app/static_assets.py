@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import logging
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Versioned URLs (?v=<hash>) never change content, so browsers may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Unversioned assets and HTML pages are revalidated with the ETag on every use
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+class StaticAsset:
+    def __init__(self, name: str, content: bytes):
+        self.name = name
+        self.content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/"):
+            self.content_type += "; charset=utf-8"
+        self.version = hashlib.sha256(content).hexdigest()[:16]
+
+        # Precompute every encoding once; a variant is only kept if it is smaller
+        self.variants = {"identity": content}
+        gzipped = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(gzipped) < len(content):
+            self.variants["gzip"] = gzipped
+        if brotli is not None:
+            compressed = brotli.compress(content, quality=11)
+            if len(compressed) < len(content):
+                self.variants["br"] = compressed
+
+    def etag(self, encoding: str) -> str:
+        # Strong ETags must differ between encodings of the same resource
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"{self.version}{suffix}"'
+
+class StaticAssetStore:
+    """
+    Serves the files in the static directory from memory with precompressed
+    variants, strong ETags and Cache-Control headers.
+    """
+
+    def __init__(self, static_dir: str):
+        self.static_dir = static_dir
+        self.assets = {}
+
+    def load(self):
+        for file_name in sorted(os.listdir(self.static_dir)):
+            file_path = os.path.join(self.static_dir, file_name)
+            if not os.path.isfile(file_path) or file_name.endswith(".html"):
+                continue
+            with open(file_path, "rb") as f:
+                self.assets[file_name] = StaticAsset(file_name, f.read())
+
+        # HTML pages are loaded last so their asset links can carry the content hash
+        for file_name in sorted(os.listdir(self.static_dir)):
+            if not file_name.endswith(".html"):
+                continue
+            with open(os.path.join(self.static_dir, file_name), "r", encoding="utf-8") as f:
+                html = self.version_asset_links(f.read())
+            self.assets[file_name] = StaticAsset(file_name, html.encode("utf-8"))
+
+        for asset in self.assets.values():
+            sizes = ", ".join(f"{encoding}={len(body)}" for encoding, body in asset.variants.items())
+            logger.info(f"📦 Loaded static asset {asset.name} ({sizes} bytes)")
+
+    def version_asset_links(self, html: str) -> str:
+        def add_version(match):
+            asset = self.assets.get(match.group(2))
+            if asset is None:
+                return match.group(0)
+            return f"{match.group(1)}/static/{asset.name}?v={asset.version}{match.group(3)}"
+
+        return re.sub(r'((?:href|src)=")/static/([^"?#]+)(")', add_version, html)
+
+    def response(self, name: str, request: Request) -> Response:
+        asset = self.assets.get(name)
+        if asset is None:
+            return Response(status_code=404)
+
+        encoding = self.negotiate_encoding(asset, request.headers.get("accept-encoding", ""))
+        etag = asset.etag(encoding)
+        versioned = request.query_params.get("v") == asset.version
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding"
+        }
+
+        if self.etag_matches(request.headers.get("if-none-match"), asset):
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(
+            content=asset.variants[encoding],
+            media_type=asset.content_type,
+            headers=headers
+        )
+
+    @staticmethod
+    def negotiate_encoding(asset: StaticAsset, accept_encoding: str) -> str:
+        accepted = {}
+        for part in accept_encoding.split(","):
+            coding, _, params = part.strip().partition(";")
+            quality = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+            if coding:
+                accepted[coding.lower()] = quality
+
+        for encoding in ("br", "gzip"):
+            if encoding in asset.variants and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return encoding
+        return "identity"
+
+    @staticmethod
+    def etag_matches(if_none_match: str, asset: StaticAsset) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        # Every encoding carries the same content, so any of them validates the cache
+        known = {asset.etag(encoding) for encoding in asset.variants}
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return bool(known & candidates)
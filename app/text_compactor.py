@@ -0,0 +1,154 @@
+import math
+import re
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Header merge_chunks puts in front of each chunk (possibly glued to its "=" rule)
+CHUNK_HEADER = re.compile(r"^=*\s*=== CHUNK \d+: PAGES (\d+)-(\d+) ===\s*$", re.MULTILINE)
+# The extraction prompt asks for a line holding "=" between pages
+PAGE_SEPARATOR = re.compile(r"^\s*=+\s*$", re.MULTILINE)
+# "Page 3", "Slide 3 of 24", "p. 3"
+PAGE_NUMBER_LINE = re.compile(
+    r"^[*_\s]*(?:page|slide|p\.)\s*\d{1,4}(?:\s*(?:/|of)\s*\d{1,4})?[*_\s]*$",
+    re.IGNORECASE
+)
+# "3 / 24", "3 of 24": only a page number when it starts with the page's own number
+PAGE_FRACTION_LINE = re.compile(r"^[*_\s]*(\d{1,4})\s*(?:/|of)\s*(\d{1,4})[*_\s]*$", re.IGNORECASE)
+
+# A line is boilerplate when it repeats on at least this share of the pages (and on 3+ pages)
+BOILERPLATE_MIN_SHARE = 0.4
+BOILERPLATE_MIN_PAGES = 3
+BOILERPLATE_MAX_CHARS = 200
+
+# Cumulative results for the documents this worker process stored, reported on /metrics;
+# updated by the caller, since the same text may also be compacted for other uses
+compaction_totals = {
+    "documents": 0,
+    "original_chars": 0,
+    "compact_chars": 0
+}
+
+def split_pages(text: str) -> list:
+    """
+    Splits extractor output into [(first_page, last_page, text)], one entry per
+    page when the page markers line up with the chunk's page range.
+    """
+    sections = []
+    headers = list(CHUNK_HEADER.finditer(text))
+    if not headers:
+        sections.append((1, None, text))
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        sections.append((int(header.group(1)), int(header.group(2)), text[header.end():end]))
+
+    pages = []
+    for first_page, last_page, section in sections:
+        segments = [segment for segment in PAGE_SEPARATOR.split(section) if segment.strip()]
+        if last_page is None and len(segments) == 1:
+            # No markers at all: the page range is unknown
+            pages.append((first_page, None, segments[0]))
+            continue
+        if last_page is not None and len(segments) > last_page - first_page + 1:
+            # More segments than pages: the markers cannot be trusted, keep the chunk whole
+            pages.append((first_page, last_page, "\n".join(segments)))
+            continue
+        for offset, segment in enumerate(segments):
+            pages.append((first_page + offset, first_page + offset, segment))
+    return pages
+
+def _normalize_whitespace(text: str) -> list:
+    lines = [re.sub(r"[ \t\u00a0]+", " ", line).strip() for line in text.splitlines()]
+    compact = []
+    for line in lines:
+        # At most one blank line in a row
+        if line or (compact and compact[-1]):
+            compact.append(line)
+    while compact and not compact[-1]:
+        compact.pop()
+    return compact
+
+def _boilerplate_key(line: str, page: int) -> str:
+    # "Confidential - Page 3" on page 3 and "Confidential - Page 4" on page 4 are the
+    # same footer; other numbers, e.g. in "Slide title 3", are content and must match exactly
+    key = re.sub(rf"\b(page|slide|p\.)(\s*){page}\b", r"\1\2#", line.lower())
+    return re.sub(rf"(?<![\d/]){page}(\s*(?:/|of)\s*\d)", r"#\1", key)
+
+def _is_page_number(line: str, page: int, position: int, line_count: int) -> bool:
+    if PAGE_NUMBER_LINE.match(line):
+        return True
+    fraction = PAGE_FRACTION_LINE.match(line)
+    if fraction and int(fraction.group(1)) == page and int(fraction.group(2)) >= page:
+        return True
+    # A bare number is only a page number when it is the page's own, at its top or bottom
+    return line.strip("*_ ") == str(page) and position in (0, line_count - 1)
+
+def compact_text(text: str) -> dict:
+    """
+    Returns {"text", "page_map", "stats"}: the extracted text with extraction
+    scaffolding, page numbers and lines repeated across pages removed, pages
+    labelled "[Page N]", and the character range of every page in the result.
+    """
+    pages = [(first, last, _normalize_whitespace(body)) for first, last, body in split_pages(text)]
+
+    page_counts = Counter()
+    first_seen = {}
+    for first_page, _, lines in pages:
+        for line in lines:
+            if line and len(line) <= BOILERPLATE_MAX_CHARS and re.search(r"[^\W\d_]", line) \
+                    and not PAGE_NUMBER_LINE.match(line):
+                first_seen.setdefault(_boilerplate_key(line, first_page), line)
+        page_counts.update({_boilerplate_key(line, first_page) for line in lines if line})
+
+    min_pages = max(BOILERPLATE_MIN_PAGES, math.ceil(BOILERPLATE_MIN_SHARE * len(pages)))
+    boilerplate = {key for key in first_seen if page_counts[key] >= min_pages}
+
+    removed_lines = 0
+    blocks = []
+    page_map = []
+    if boilerplate:
+        # Keep one copy so that e.g. a confidentiality notice is not lost entirely
+        repeated = "\n".join(first_seen[key] for key in first_seen if key in boilerplate)
+        blocks.append(f"[Repeated on most pages]\n{repeated}")
+
+    offset = len(blocks[0]) + 2 if blocks else 0
+    for first_page, last_page, lines in pages:
+        kept = []
+        for position, line in enumerate(lines):
+            if line and (_boilerplate_key(line, first_page) in boilerplate or _is_page_number(line, first_page, position, len(lines))):
+                removed_lines += 1
+                continue
+            kept.append(line)
+        body = "\n".join(_normalize_whitespace("\n".join(kept)))
+        if not body:
+            continue
+
+        if last_page is None:
+            block = body
+        elif first_page == last_page:
+            block = f"[Page {first_page}]\n{body}"
+        else:
+            block = f"[Pages {first_page}-{last_page}]\n{body}"
+        page_map.append({"first_page": first_page, "last_page": last_page, "start": offset, "end": offset + len(block)})
+        blocks.append(block)
+        offset += len(block) + 2
+
+    compact = "\n\n".join(blocks)
+    stats = {
+        "pages": len(page_map),
+        "original_chars": len(text),
+        "compact_chars": len(compact),
+        "compression_ratio": round(len(compact) / len(text), 3) if text else 1.0,
+        # Same ~4 characters per token estimate as the model router
+        "estimated_tokens_saved": max(0, (len(text) - len(compact)) // 4),
+        "boilerplate_lines": len(boilerplate),
+        "removed_lines": removed_lines
+    }
+
+    logger.info(
+        f"🗜️ Compacted text {stats['original_chars']} -> {stats['compact_chars']} chars "
+        f"(ratio {stats['compression_ratio']}, ~{stats['estimated_tokens_saved']} tokens saved, "
+        f"{stats['boilerplate_lines']} boilerplate lines, {removed_lines} lines removed)"
+    )
+    return {"text": compact, "page_map": page_map, "stats": stats}
@@ -1,20 +1,72 @@
 import openai
 import httpx
-import requests
-import os
+import asyncio
+import re
 import logging
-from dotenv import load_dotenv
+from urllib.parse import urlsplit
+from settings import get_settings
+from model_router import get_model_router
+from research_cache import ResearchCache, normalize_company_name
+from circuit_breaker import find_circuit_open, get_breaker
 
-load_dotenv()
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# topic -> (digest section heading, what to ask Perplexity about the company)
+# Keys match settings.WEB_RESEARCH_TOPICS
+RESEARCH_TOPICS = {
+    "news": ("📰 Recent News", "recent news, product launches and announcements"),
+    "funding": ("💰 Funding", "funding rounds, investors, valuation and acquisitions"),
+    "competitors": ("🥊 Competitors", "main competitors and how the company compares to them"),
+    "leadership": ("👥 Leadership", "founders, executives and leadership changes"),
+}
+
+ITEM_FORMAT = """The output format must be **exactly** like this (keep emojis and spacing):  
+                        
+                        
+                        ### 📌 [Title]  
+
+                        **Resumo**  
+                        - 🔹 [Relevant point 1]  
+                        - 🔹 [Relevant point 2]
+
+                        - Date: [input the date here]
+                        - [Source Name]: [input the link here]
+                        """
+
+def normalize_url(url: str) -> str:
+    # Same article behind http/https, www. or tracking parameters
+    parts = urlsplit(url.strip().rstrip(".,;)>]"))
+    host = parts.netloc.lower().removeprefix("www.")
+    return f"{host}{parts.path.rstrip('/')}"
+
+def normalize_title(title: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", title.lower()).strip()
+
+def split_items(content: str) -> tuple:
+    """
+    Splits a Perplexity answer into (preamble, ["### ..." item blocks]).
+    """
+    blocks = re.split(r"(?m)^\s*(?=###\s)", content)
+    preamble = blocks[0].strip() if blocks and not blocks[0].lstrip().startswith("###") else ""
+    items = [block.strip() for block in blocks if block.lstrip().startswith("###")]
+    return preamble, items
+
 class WebResearchAgent:
     def __init__(self):
-        self.openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.perplexity_api_key = os.getenv("PERPLEXITY_API_KEY")
+        self.openai_client = openai.AsyncOpenAI(api_key=get_settings().openai_api_key)
+        self.model_router = get_model_router()
+        self.perplexity_api_key = get_settings().perplexity_api_key
         self.perplexity_url = "https://api.perplexity.ai/chat/completions"
+        self.perplexity_timeout = 120.0
+        self.research_topics = get_settings().web_research_topics
+        # One connection pool for all Perplexity queries, created on first use
+        self._http_client = None
+        self.perplexity_breaker = get_breaker("perplexity", slow_call_seconds=get_settings().perplexity_slow_call_seconds)
+        self.research_cache = ResearchCache(
+            "company_research",
+            get_settings().web_research_cache_ttl,
+            get_settings().web_research_cache_stale
+        )
         
         self.company_extraction_prompt = """You are a company name extractor. Your only task is to identify and return the company name from the provided text.
 
@@ -38,19 +90,23 @@ Your response must be only the company name."""
             logger.info("🔍 Starting company name extraction...")
             logger.info(f"📄 Text length: {len(extracted_text)} characters")
             
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.company_extraction_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Extract the company name from this text:\n\n{extracted_text}"
-                    }
-                ],
-                temperature=0.1
+            response = await self.model_router.call(
+                "web_research.company_name",
+                extracted_text,
+                lambda model: self.openai_client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": self.company_extraction_prompt
+                        },
+                        {
+                            "role": "user",
+                            "content": f"Extract the company name from this text:\n\n{extracted_text}"
+                        }
+                    ],
+                    temperature=0.1
+                )
             )
             
             company_name = response.choices[0].message.content.strip()
@@ -63,62 +119,163 @@ Your response must be only the company name."""
             logger.error(f"❌ Company name extraction error: {str(e)}")
             raise Exception(f"Failed to extract company name: {str(e)}")
 
-    async def research_company(self, company_name: str) -> str:
+    async def research_company(self, company_name: str) -> dict:
+        """
+        Company research as {"content", "missing_topics"}, served from the shared cache
+        when another deck already triggered it for the same (normalized) company name.
+        Only digests covering every topic are cached.
+        """
+        return await self.research_cache.get_or_compute(
+            normalize_company_name(company_name),
+            lambda: self.fetch_company_research(company_name),
+            cacheable=lambda research: not research["missing_topics"]
+        )
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=self.perplexity_timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return self._http_client
+
+    async def aclose(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+
+    async def query_perplexity(self, question: str) -> dict:
+        """
+        Returns {"content", "sources"} for one Perplexity question.
+        """
+        headers = {
+            "Authorization": f"Bearer {self.perplexity_api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        payload = {
+            "model": "sonar-pro",
+            "messages": [
+                {
+                    "role": "user",
+                    "content": question
+                }
+            ]
+        }
+        
+        async def post():
+            response = await self.http_client.post(self.perplexity_url, headers=headers, json=payload)
+            if response.status_code != 200:
+                raise Exception(f"Perplexity API error: {response.status_code} - {response.text}")
+            return response
+        
+        response = await self.perplexity_breaker.call(post)
+        response_data = response.json()
+        sources = response_data.get("search_results") or [
+            {"url": url, "title": ""} for url in response_data.get("citations", [])
+        ]
+        return {
+            "content": response_data["choices"][0]["message"]["content"],
+            "sources": sources
+        }
+
+    async def fetch_company_research(self, company_name: str) -> dict:
         try:
-            logger.info(f"🔍 Starting research for company: {company_name}")
+            logger.info(f"🔍 Starting research for company: {company_name} ({', '.join(self.research_topics)})")
             
             if not self.perplexity_api_key:
                 raise Exception("PERPLEXITY_API_KEY not found in environment variables")
             
-            headers = {
-                "Authorization": f"Bearer {self.perplexity_api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": "sonar-pro",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": f"""Identify news or other relevant content about this company: {company_name}. 
+            def query_topic(topic: str):
+                return self.query_perplexity(
+                    f"""Identify {RESEARCH_TOPICS[topic][1]} about this company: {company_name}. 
                         
-                        The output format must be **exactly** like this (keep emojis and spacing):  
-                        
-                        
-                        ### 📌 [Title]  
-
-                        **Resumo**  
-                        - 🔹 [Relevant point 1]  
-                        - 🔹 [Relevant point 2]
-
-                        - Date: [input the date here]
-                        - [Source Name]: [input the link here]
-                        """
-                    }
-                ]
-            }
+                        {ITEM_FORMAT}"""
+                )
             
-            response = requests.post(self.perplexity_url, headers=headers, json=payload)
+            # While Perplexity recovers its breaker lets a single probe through and rejects
+            # concurrent calls, so one topic goes first and the rest fan out after it
+            probe_topics = self.research_topics[:1] if self.perplexity_breaker.state != "closed" else []
+            results = await asyncio.gather(*(query_topic(topic) for topic in probe_topics), return_exceptions=True)
             
-            if response.status_code != 200:
-                raise Exception(f"Perplexity API error: {response.status_code} - {response.text}")
+            # Targeted queries run concurrently, so the digest costs the latency of one query
+            results += await asyncio.gather(*(
+                query_topic(topic) for topic in self.research_topics[len(probe_topics):]
+            ), return_exceptions=True)
+            
+            topic_results = {}
+            for topic, result in zip(self.research_topics, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"⚠️ Perplexity '{topic}' query failed: {str(result)}")
+                else:
+                    topic_results[topic] = result
             
-            response_data = response.json()
-            research_content = response_data["choices"][0]["message"]["content"]
+            if not topic_results:
+                raise results[0]
+            
+            research_content = self.merge_research(topic_results)
+            missing_topics = [topic for topic in self.research_topics if topic not in topic_results]
             
             logger.info(f"✅ Research completed. Response length: {len(research_content)} characters")
-            logger.info(f"📄 Research preview: {research_content[:200]}...")
+            logger.debug(f"📄 Research preview: {research_content[:200]}...")
             
-            return research_content
+            return {
+                "content": research_content,
+                "missing_topics": missing_topics
+            }
             
         except Exception as e:
             logger.error(f"❌ Company research error: {str(e)}")
             raise Exception(f"Failed to research company: {str(e)}")
 
-    async def full_research(self, extracted_text: str) -> dict:
+    def merge_research(self, topic_results: dict) -> str:
+        """
+        Merges the per-topic answers into one digest. An item already reported under
+        an earlier topic (same source URL or same title) is dropped, and all
+        sources are listed once at the end.
+        """
+        seen_urls = set()
+        seen_titles = set()
+        sections = []
+        duplicates = 0
+        
+        for topic, result in topic_results.items():
+            preamble, items = split_items(result["content"])
+            kept = []
+            for item in items:
+                title = normalize_title(item.splitlines()[0].lstrip("#").replace("📌", ""))
+                urls = {normalize_url(url) for url in re.findall(r"https?://[^\s)\]>]+", item)}
+                if (title and title in seen_titles) or (urls & seen_urls):
+                    duplicates += 1
+                    continue
+                seen_titles.add(title)
+                seen_urls.update(urls)
+                kept.append(item)
+            
+            body = "\n\n".join(kept) if kept else preamble
+            if body:
+                sections.append(f"## {RESEARCH_TOPICS[topic][0]}\n\n{body}")
+        
+        sources = []
+        listed = set()
+        for result in topic_results.values():
+            for source in result["sources"]:
+                url = source.get("url")
+                if not url or normalize_url(url) in listed:
+                    continue
+                listed.add(normalize_url(url))
+                sources.append(f"- [{source.get('title') or url}]({url})")
+        if sources:
+            sections.append("## 🔗 Sources\n\n" + "\n".join(sources))
+        
+        logger.info(f"🧩 Merged {len(topic_results)} research topics, dropped {duplicates} duplicate items, {len(sources)} unique sources")
+        return "\n\n".join(sections)
+
+    async def full_research(self, extracted_text: str, company_name: str = None) -> dict:
         try:
-            # Step 1: Extract company name
-            company_name = await self.extract_company_name(extracted_text)
+            # Step 1: Extract company name, unless it was already extracted while the PDF streamed in
+            if not company_name:
+                company_name = await self.extract_company_name(extracted_text)
             
             if company_name == "COMPANY NOT FOUND":
                 return {
@@ -127,11 +284,31 @@ Your response must be only the company name."""
                 }
             
             # Step 2: Research the company
-            research_content = await self.research_company(company_name)
+            try:
+                research = await self.research_company(company_name)
+            except Exception as e:
+                if find_circuit_open(e) is None:
+                    raise
+                # Perplexity is degraded: answer without web research instead of failing
+                logger.warning(f"⚡ Skipping web research for {company_name}: {str(find_circuit_open(e))}")
+                return {
+                    "company_name": company_name,
+                    "research_content": "⚠️ Web research is temporarily unavailable. Please retry in a few minutes.",
+                    "degraded": True
+                }
+            
+            if research["missing_topics"]:
+                # A partial digest is served, but main only keeps it for DEGRADED_RESULT_TTL
+                missing = ", ".join(RESEARCH_TOPICS[topic][0] for topic in research["missing_topics"])
+                return {
+                    "company_name": company_name,
+                    "research_content": f"{research['content']}\n\n⚠️ Not available right now, please retry in a few minutes: {missing}",
+                    "degraded": True
+                }
             
             return {
                 "company_name": company_name,
-                "research_content": research_content
+                "research_content": research["content"]
             }
             
         except Exception as e:
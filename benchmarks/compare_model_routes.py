@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Runs agent tasks on an extracted deck with several candidate models and records
+latency and output length per route, to decide what MODEL_ROUTES should say.
+
+    python benchmarks/compare_model_routes.py deck.txt \
+        --route web_research.company_name=gpt-4o-mini,gpt-4o \
+        --route pitchdeck.analyze=gpt-4o,gpt-4.1 --repeat 3 --output routes.json
+
+Calls the real OpenAI API, so OPENAI_API_KEY must be set.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+# Add the app directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from agent_registry import get_agent
+from model_router import get_model_router, response_output_length
+
+# Route -> coroutine running the agent step that uses it on the deck text
+ROUTE_RUNNERS = {
+    "pitchdeck.analyze": lambda text: get_agent("pitchdeck").analyze_pitchdeck(text),
+    "product.analyze": lambda text: get_agent("product").analyze_product(text),
+    "web_research.company_name": lambda text: get_agent("web_research").extract_company_name(text),
+    "market_size.market_query": lambda text: get_agent("market_size").extract_market_query(text),
+}
+
+def parse_route(value: str) -> tuple:
+    route, _, models = value.partition("=")
+    if route not in ROUTE_RUNNERS:
+        raise argparse.ArgumentTypeError(f"route must be one of {', '.join(ROUTE_RUNNERS)}")
+    return route, [model.strip() for model in models.split(",") if model.strip()]
+
+async def run_route(route: str, model: str, text: str, repeat: int) -> dict:
+    router = get_model_router()
+    # Pin the route to a single model without fallbacks for the measurement
+    router.routes[route] = [{"model": model, "fallbacks": []}]
+    
+    latencies = []
+    output_lengths = []
+    errors = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            output = await ROUTE_RUNNERS[route](text)
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        latencies.append(time.perf_counter() - start)
+        output_lengths.append(len(output) if isinstance(output, str) else response_output_length(output))
+    
+    return {
+        "route": route,
+        "model": model,
+        "runs": repeat,
+        "errors": errors,
+        "median_latency_seconds": round(statistics.median(latencies), 3) if latencies else None,
+        "max_latency_seconds": round(max(latencies), 3) if latencies else None,
+        "median_output_chars": round(statistics.median(output_lengths)) if output_lengths else None
+    }
+
+async def main(args):
+    with open(args.text_file, "r") as f:
+        text = f.read()
+    
+    results = []
+    for route, models in args.route:
+        for model in models:
+            result = await run_route(route, model, text, args.repeat)
+            results.append(result)
+            print(
+                f"{route:<28} {model:<16} median {result['median_latency_seconds']}s "
+                f"max {result['max_latency_seconds']}s  output {result['median_output_chars']} chars  "
+                f"errors {len(result['errors'])}"
+            )
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare model routes on an extracted deck")
+    parser.add_argument("text_file", help="File containing text extracted from a deck (e.g. the /upload output)")
+    parser.add_argument("--route", type=parse_route, action="append", required=True,
+                        help="route=model1,model2 (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per route and model")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    asyncio.run(main(parser.parse_args()))
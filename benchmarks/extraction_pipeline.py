@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the local parts of the extraction pipeline (page counting, chunk
+splitting with verification, and a full extraction with the OpenAI calls
+stubbed) on synthetic decks, reporting time, peak RSS and temporary disk usage.
+
+    python benchmarks/extraction_pipeline.py --pages 10,100,1000 --kinds text,image \
+        --chunk-pages 20 --output extraction.json
+
+Decks are generated deterministically and kept in --corpus-dir, so runs with
+different chunking settings compare like with like. Each configuration runs in
+a fresh process so that peak RSS is not inherited from earlier runs. No API
+key is needed. Settings come from the environment as usual, e.g. PDF_OPTIMIZE=1
+includes PDF slimming in the stubbed extraction.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+
+WORDS = (
+    "market revenue growth customers platform pricing churn retention pipeline enterprise "
+    "subscription margin runway hiring product roadmap expansion partners segment adoption"
+).split()
+
+def write_pdf(path: str, page_objects: list):
+    """
+    Writes a minimal PDF. page_objects holds, per page, a list of (dictionary,
+    stream bytes) objects: first the content stream, then the images it draws as
+    /Im0, /Im1, ... Each dictionary's "{length}" is filled in with its stream length.
+    """
+    # 1: catalog, 2: page tree, 3: font; then per page the page and its objects
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in page_objects:
+        page_id = len(objects) + 1
+        object_ids = [page_id + 1 + i for i in range(len(page))]
+        xobjects = " ".join(f"/Im{i} {object_id} 0 R" for i, object_id in enumerate(object_ids[1:]))
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 960 540] /Contents {object_ids[0]} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> /XObject << {xobjects} >> >> >>".encode()
+        )
+        for dictionary, stream in page:
+            objects.append(dictionary.format(length=len(stream)).encode() + b"\nstream\n" + stream + b"\nendstream")
+        page_ids.append(page_id)
+
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        f.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode())
+        f.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+def text_stream(rng: random.Random, page_number: int, lines: int) -> bytes:
+    commands = [f"BT /F1 28 Tf 60 480 Td (Slide {page_number}: {rng.choice(WORDS).title()} overview) Tj ET"]
+    for line in range(lines):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(12))
+        commands.append(f"BT /F1 12 Tf 60 {440 - line * 14} Td ({sentence}) Tj ET")
+    commands.append(f"BT /F1 9 Tf 60 20 Td (Confidential - Page {page_number}) Tj ET")
+    return "\n".join(commands).encode()
+
+def jpeg_image(rng: random.Random, width: int, height: int, quality: int) -> bytes:
+    from PIL import Image
+    # Upscaled noise: photo-like entropy without the cost of full-resolution noise
+    small = Image.frombytes("RGB", (32, 18), bytes(rng.getrandbits(8) for _ in range(32 * 18 * 3)))
+    buffer = io.BytesIO()
+    small.resize((width, height), Image.BILINEAR).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+def generate_deck(path: str, kind: str, pages: int, image_width: int):
+    rng = random.Random(f"{kind}-{pages}")
+    page_objects = []
+    for page_number in range(1, pages + 1):
+        if kind == "text":
+            page_objects.append([("<< /Length {length} >>", text_stream(rng, page_number, 25))])
+            continue
+        # Image-heavy: a full-slide picture with a few lines of text over it
+        image_height = image_width * 9 // 16
+        image = jpeg_image(rng, image_width, image_height, 80)
+        content = b"q 960 0 0 540 0 0 cm /Im0 Do Q\n" + text_stream(rng, page_number, 3)
+        page_objects.append([
+            ("<< /Length {length} >>", content),
+            (f"<< /Type /XObject /Subtype /Image /Width {image_width} /Height {image_height} "
+             "/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {length} >>", image)
+        ])
+    write_pdf(path, page_objects)
+
+def ensure_deck(corpus_dir: str, kind: str, pages: int, image_width: int) -> str:
+    suffix = f"-{image_width}px" if kind == "image" else ""
+    path = os.path.join(corpus_dir, f"{kind}-{pages}p{suffix}.pdf")
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        generate_deck(path, kind, pages, image_width)
+        print(f"Generated {path} ({os.path.getsize(path)} bytes) in {time.perf_counter() - start:.1f}s")
+    return path
+
+class StubFiles:
+    async def create(self, file, purpose):
+        file.read()
+        return type("Upload", (), {"id": f"file-stub-{id(file)}"})()
+
+    async def delete(self, file_id):
+        pass
+
+class StubResponses:
+    async def create(self, model, input):
+        text = "\n=\n".join(f"Slide text {i}" for i in range(20))
+        return type("Response", (), {"output_text": text})()
+
+def run_worker(pdf_path: str, chunk_pages: int) -> dict:
+    """
+    Measures one configuration; runs in its own process.
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-stub")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, APP_DIR)
+    from direct_pdf_extractor import DirectPDFExtractor
+    from pdf_optimizer import shutdown_process_pool
+
+    extractor = DirectPDFExtractor()
+    extractor.max_pages_per_chunk = chunk_pages
+    extractor.client = type("StubClient", (), {"files": StubFiles(), "responses": StubResponses()})()
+
+    result = {"file_bytes": os.path.getsize(pdf_path), "chunk_pages": chunk_pages}
+
+    start = time.perf_counter()
+    result["pages"] = extractor.count_pdf_pages(pdf_path)
+    result["count_seconds"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    chunk_files = extractor.split_pdf_into_chunks(pdf_path)
+    result["split_seconds"] = round(time.perf_counter() - start, 3)
+    result["chunks"] = len(chunk_files)
+    # Every chunk file exists until extraction finishes, so this is the peak temp usage
+    result["temp_disk_bytes"] = sum(chunk["file_size"] for chunk in chunk_files)
+    for chunk in chunk_files:
+        os.unlink(chunk["file_path"])
+
+    start = time.perf_counter()
+    text, _ = asyncio.run(extractor.extract_text_from_pdf(pdf_path))
+    result["stubbed_extraction_seconds"] = round(time.perf_counter() - start, 3)
+    result["extracted_chars"] = len(text)
+
+    # PDF slimming workers only show up in RUSAGE_CHILDREN once they have exited
+    shutdown_process_pool()
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 1)
+    result["child_processes_peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit, 1)
+    return result
+
+def main(args):
+    os.makedirs(args.corpus_dir, exist_ok=True)
+    results = []
+    for kind in args.kinds:
+        for pages in args.pages:
+            pdf_path = ensure_deck(args.corpus_dir, kind, pages, args.image_width)
+            for _ in range(args.repeat):
+                completed = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--worker", pdf_path, "--chunk-pages", str(args.chunk_pages)],
+                    capture_output=True, text=True
+                )
+                if completed.returncode != 0:
+                    print(f"{kind} {pages}p failed:\n{completed.stderr}")
+                    break
+                result = {"kind": kind, **json.loads(completed.stdout.strip().splitlines()[-1])}
+                results.append(result)
+                print(
+                    f"{kind:<6} {pages:>5}p {result['file_bytes'] / 1e6:>8.1f} MB  "
+                    f"count {result['count_seconds']:>7.3f}s  split {result['split_seconds']:>7.3f}s  "
+                    f"extract {result['stubbed_extraction_seconds']:>7.3f}s  "
+                    f"peak RSS {result['peak_rss_mb']:>7.1f} MB  temp {result['temp_disk_bytes'] / 1e6:>8.1f} MB"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark local PDF extraction steps on synthetic decks")
+    parser.add_argument("--pages", type=lambda value: [int(p) for p in value.split(",")], default=[10, 100, 1000],
+                        help="Comma-separated page counts")
+    parser.add_argument("--kinds", type=lambda value: value.split(","), default=["text", "image"],
+                        help="Comma-separated deck kinds: text, image")
+    parser.add_argument("--chunk-pages", type=int, default=20, help="Pages per chunk (DirectPDFExtractor.max_pages_per_chunk)")
+    parser.add_argument("--image-width", type=int, default=1280, help="Width of each slide image in image decks")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per configuration")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "buy_side_workflow_bench_corpus"),
+                        help="Where generated decks are kept between runs")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.chunk_pages)))
+    else:
+        main(args)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Measures the end-to-end latency of a cold market size analysis (no cached
+research) in the original flow (one web-search call, then formatting) and in
+the research flows (market query, web research, then sizing), and of a warm
+run served from the research cache.
+
+    python benchmarks/market_size_latency.py deck.txt --repeat 3 --output market.json
+
+Calls the real OpenAI API, so OPENAI_API_KEY must be set. With --stub-latency
+every model call is replaced by a sleep of that many seconds, which shows how
+many calls each flow runs one after another.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Add the app directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+# flow -> (MARKET_RESEARCH_MODE is parallel, research cache enabled)
+FLOWS = {
+    "original": (False, False),
+    "single_cold": (False, True),
+    "parallel_cold": (True, True),
+    "parallel_warm": (True, True),
+}
+
+class StubResult:
+    def __init__(self, text):
+        self.output_text = text
+        self.choices = [type("Choice", (), {"message": type("Message", (), {"content": text})()})()]
+
+class StubEndpoint:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return StubResult("## TAM\n- $1B (2024, stub)")
+
+def stub_client(latency: float):
+    endpoint = StubEndpoint(latency)
+    chat = type("Chat", (), {"completions": endpoint})()
+    return type("StubClient", (), {"responses": endpoint, "chat": chat})()
+
+async def run_flow(flow: str, text: str, repeat: int, stub_latency: float) -> dict:
+    from market_size_agent import MarketSizeAgent
+
+    parallel, cached = FLOWS[flow]
+    agent = MarketSizeAgent()
+    agent.parallel_research = parallel
+    if not cached:
+        agent.research_cache.fresh_seconds = 0
+    if stub_latency is not None:
+        agent.client = stub_client(stub_latency)
+
+    totals = []
+    phases = []
+    errors = []
+    for run in range(repeat):
+        if cached and flow != "parallel_warm":
+            # A fresh namespace per run keeps the research cold
+            agent.research_cache.namespace = f"market_research_bench_{flow}_{run}_{time.time()}"
+        elif flow == "parallel_warm" and run == 0:
+            agent.research_cache.namespace = f"market_research_bench_{flow}_{time.time()}"
+            await agent.analyze_market_size(text)
+
+        start = time.perf_counter()
+        result = await agent.analyze_market_size(text)
+        elapsed = time.perf_counter() - start
+        if not result["success"]:
+            errors.append(result["error"])
+            continue
+        totals.append(elapsed)
+        phases.append(result["timings"])
+
+    return {
+        "flow": flow,
+        "runs": repeat,
+        "errors": errors,
+        "median_seconds": round(statistics.median(totals), 2) if totals else None,
+        "max_seconds": round(max(totals), 2) if totals else None,
+        "phases": phases
+    }
+
+async def main(args):
+    with open(args.text_file, "r") as f:
+        text = f.read()
+
+    results = []
+    for flow in args.flows:
+        result = await run_flow(flow, text, args.repeat, args.stub_latency)
+        results.append(result)
+        last_phases = ", ".join(f"{phase} {seconds}s" for phase, seconds in (result["phases"][-1] if result["phases"] else {}).items())
+        print(
+            f"{flow:<14} median {result['median_seconds']}s  max {result['max_seconds']}s  "
+            f"errors {len(result['errors'])}  [{last_phases}]"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare cold and warm market size analysis latency per flow")
+    parser.add_argument("text_file", help="Extracted deck text")
+    parser.add_argument("--flows", type=lambda value: value.split(","), default=list(FLOWS),
+                        help=f"Comma-separated flows: {', '.join(FLOWS)}")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per flow")
+    parser.add_argument("--stub-latency", type=float, help="Replace every model call with a sleep of this many seconds")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.stub_latency is not None:
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark-stub")
+        os.environ.setdefault("STATE_DB_PATH", os.path.join(tempfile.gettempdir(), "market_size_latency_bench.sqlite3"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    asyncio.run(main(args))
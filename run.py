@@ -1,24 +1,80 @@
 #!/usr/bin/env python3
 import uvicorn
+import argparse
 import os
 import sys
 
 # Add the app directory to the Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
 
+# Each worker holds its own agents, connection pools and process pool
+MAX_DEFAULT_WORKERS = 4
+
+def default_workers() -> int:
+    # os.cpu_count() is the host's core count inside containers; the affinity mask
+    # at least reflects cpusets, and the cap keeps unknown quotas safe
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(1, min(cpus, MAX_DEFAULT_WORKERS))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the PDF Text Extractor server")
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        default=os.environ.get("APP_ENV", "").lower() == "production",
+        help="Run with multiple workers, preloading and graceful shutdown (or set APP_ENV=production)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("WEB_CONCURRENCY", default_workers())),
+        help=f"Number of worker processes in production mode (defaults to WEB_CONCURRENCY or the available CPUs, at most {MAX_DEFAULT_WORKERS})"
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=int,
+        default=int(os.environ.get("GRACEFUL_SHUTDOWN_TIMEOUT", 30)),
+        help="Seconds to let in-flight requests drain on shutdown"
+    )
+    parser.add_argument(
+        "--no-preload",
+        action="store_true",
+        default=os.environ.get("PRELOAD_APP", "1") == "0",
+        help="Skip importing the application in the parent process before starting workers"
+    )
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     print("Starting PDF Text Extractor...")
     
     # Use Railway's PORT environment variable if available, otherwise default to 8000
     port = int(os.environ.get("PORT", 8000))
+    workers = max(1, args.workers) if args.production else 1
     
     print(f"Server will be available at: http://0.0.0.0:{port}")
     print("Make sure to set your OPENAI_API_KEY in the .env file")
     
+    if args.production:
+        print(f"Production mode: {workers} workers, {args.graceful_timeout}s graceful shutdown")
+        
+        if not args.no_preload:
+            # uvicorn spawns fresh worker processes, so preloading means importing
+            # the app once here: a broken deploy fails before any worker starts
+            import main  # noqa: F401
+            print("Application preloaded successfully")
+    
     uvicorn.run(
         "main:app", 
         host="0.0.0.0", 
         port=port, 
         reload=False,  # Disable reload for production
-        app_dir="app"
-    )
\ No newline at end of file
+        app_dir="app",
+        workers=workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=args.production,
+        forwarded_allow_ips="*" if args.production else None
+    )